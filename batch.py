@@ -0,0 +1,227 @@
+"""Answer questions from a JSONL file with the Dubai Genie pipeline, without the Streamlit UI
+
+Each input line is one conversation, either a single question or several
+turns asked in order:
+
+    {"id": "faq-1", "question": "When is the best time to visit?"}
+    {"id": "trip-7", "turns": ["Is the metro cheap?", "Does it go to the airport?"]}
+
+Conversations run on a pool of worker threads through the app's answer
+pipeline (pipeline.py): the same request scheduler, rate limit, system
+prompt, intent router, day planner, knowledge base, response cache and
+reply shaping. Each result is appended to the output JSONL as
+soon as its conversation finishes. Rerunning with the same output file
+skips the conversations that already have an answer, so an interrupted
+run picks up where it stopped and failed ones are retried.
+
+    python batch.py faq.jsonl --output answers.jsonl --workers 8
+    DG_CACHE_BACKEND=sqlite python batch.py faq.jsonl --output answers.jsonl
+
+With DG_CACHE_BACKEND=sqlite the opening answers also fill the app's shared
+response cache.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from context_window import ContextWindow, build_history
+from conversation_store import ConversationStore, make_prefix
+from llm_backends import create_backend_from_env
+from pipeline import create_pipeline_from_env
+from prompts import get_generation_config, initial_message, model_name, system_prompt
+from response_cache import config_fingerprint
+from scheduler import RequestScheduler
+
+
+def read_conversations(path):
+    """Yield (id, questions) for every line of an input JSONL file"""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "turns" in record:
+                questions = list(record["turns"])
+            elif "question" in record:
+                questions = [record["question"]]
+            else:
+                raise ValueError(f"{path}:{line_number}: expected a 'question' or 'turns' field")
+            yield record.get("id", line_number), questions
+
+
+def load_finished(path):
+    """Return the ids already answered without errors in an output file
+
+    Failed results are dropped from the file, since their conversations
+    are answered again, and so is a line cut off by an interrupted run;
+    the file is rewritten only when something was dropped.
+    """
+    if not os.path.exists(path):
+        return set()
+
+    with open(path, "rb") as f:
+        data = f.read()
+    finished = set()
+    kept = []
+    for line in data.decode("utf-8").splitlines(keepends=True):
+        if not line.endswith("\n") or not line.strip():
+            continue
+        result = json.loads(line)
+        if not result.get("error") and result["id"] not in finished:
+            finished.add(result["id"])
+            kept.append(line)
+    rewritten = "".join(kept).encode("utf-8")
+    if rewritten != data:
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(rewritten)
+        os.replace(f"{path}.tmp", path)
+    return finished
+
+
+def answer_source(turn):
+    """Which step of the pipeline answered a turn"""
+    if turn.get("intent"):
+        return "intent"
+    if turn.get("tool"):
+        return "planner"
+    if turn.get("kb_hit"):
+        return "kb"
+    if turn.get("cache_hit"):
+        return "cache"
+    return "model"
+
+
+class BatchRunner:
+    """Runs conversations through the same answer pipeline as the chat UI"""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.prefix = make_prefix(initial_message)
+
+    def answer(self, conversation, window, question, conversation_id=None):
+        """Answer the newest question of a conversation; returns the turn result"""
+        info = {"session": conversation_id}
+        first_question = conversation.user_turns == 1
+        text = self.pipeline.answer_locally(question, first_question, info)
+        if text is None:
+            summary, recent = window.fit(conversation, end=len(conversation) - 1)
+            text = "".join(self.pipeline.stream_reply(build_history(summary, recent), question, first_question, info))
+
+        turn = {"question": question, "answer": text, "source": answer_source(info)}
+        if info.get("intent"):
+            turn["intent"] = info["intent"]
+        if info.get("similar_to"):
+            turn.update(similar_to=info["similar_to"], similarity=round(info["semantic_score"], 4))
+        for field in ("format_problems", "usage"):
+            if info.get(field):
+                turn[field] = info[field]
+        return turn
+
+    def run(self, conversation_id, questions):
+        """Answer every turn of one conversation in order; stops at the first error"""
+        start = time.perf_counter()
+        conversation = ConversationStore(self.prefix)
+        window = ContextWindow(
+            max_tokens=int(os.getenv("DG_CONTEXT_TOKENS", "2000")),
+            summary_tokens=int(os.getenv("DG_SUMMARY_TOKENS", "300"))
+        )
+        result = {"id": conversation_id, "turns": []}
+
+        for question in questions:
+            conversation.append({"role": "user", "content": question})
+            turn_start = time.perf_counter()
+            try:
+                turn = self.answer(conversation, window, question, conversation_id)
+            except Exception as e:
+                # Later turns depend on this answer, so the conversation stops here
+                result["turns"].append({"question": question, "error": type(e).__name__, "message": str(e)})
+                result["error"] = type(e).__name__
+                break
+            turn["seconds"] = round(time.perf_counter() - turn_start, 4)
+            result["turns"].append(turn)
+            conversation.append({"role": "assistant", "content": turn["answer"]})
+
+        result["seconds"] = round(time.perf_counter() - start, 4)
+        return result
+
+
+def main(argv=None):
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file of questions or conversations")
+    parser.add_argument("--output", required=True, help="JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=4, help="conversations answered at the same time")
+    parser.add_argument("--requests-per-minute", type=float,
+                        default=float(os.getenv("DG_REQUESTS_PER_MINUTE", "60")), help="model request rate limit")
+    parser.add_argument("--burst", type=int, default=int(os.getenv("DG_REQUEST_BURST", "5")),
+                        help="model requests allowed at once before the rate limit applies")
+    parser.add_argument("--max-retries", type=int, default=int(os.getenv("DG_MAX_RETRIES", "3")),
+                        help="retries of a failed model request")
+    parser.add_argument("--timeout", type=float, default=float(os.getenv("DG_REQUEST_TIMEOUT", "60")),
+                        help="seconds allowed per model reply")
+    parser.add_argument("--no-local-answers", action="store_true",
+                        help="send every question to the model (skip the intent router, day planner and knowledge base answers)")
+    parser.add_argument("--restart", action="store_true", help="overwrite the output instead of resuming")
+    args = parser.parse_args(argv)
+
+    backend = create_backend_from_env(model_name, get_generation_config(), system_prompt)
+    if not backend.configured:
+        parser.error("GOOGLE_API_KEY is not set (or use DG_BACKEND=stub)")
+
+    scheduler = RequestScheduler(
+        backend,
+        max_concurrent=args.workers,
+        max_queue=max(64, args.workers * 2),
+        requests_per_minute=args.requests_per_minute,
+        burst=args.burst,
+        max_retries=args.max_retries,
+        timeout=args.timeout,
+        hedge_percentile=float(os.getenv("DG_HEDGE_PERCENTILE")) if os.getenv("DG_HEDGE_PERCENTILE") else None
+    )
+    runner = BatchRunner(create_pipeline_from_env(
+        scheduler,
+        config_fingerprint(backend.model_name, get_generation_config(), system_prompt),
+        local_answers=not args.no_local_answers
+    ))
+
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+    finished = load_finished(args.output)
+    pending = [(cid, questions) for cid, questions in read_conversations(args.input) if cid not in finished]
+    print(f"{len(finished)} conversations already answered, {len(pending)} to go", file=sys.stderr)
+
+    start = time.perf_counter()
+    sources = {}
+    failed = 0
+    with open(args.output, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(runner.run, cid, questions) for cid, questions in pending]
+        for future in as_completed(futures):
+            result = future.result()
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            failed += bool(result.get("error"))
+            for turn in result["turns"]:
+                if "source" in turn:
+                    sources[turn["source"]] = sources.get(turn["source"], 0) + 1
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "conversations": len(pending),
+        "failed": failed,
+        "seconds": round(elapsed, 2),
+        "conversations_per_second": round(len(pending) / elapsed, 2) if elapsed else None,
+        "answers_by_source": sources,
+        "scheduler": scheduler.stats(),
+    }
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+"""Load test for the Dubai Genie chat flow
+
+Drives chatbot.py headlessly with Streamlit's AppTest: N simulated users
+run chat scenarios concurrently against the offline stub backend, and
+the results (throughput, turn latency percentiles, per-session memory and
+rerun CPU time) are written as JSON.
+
+AppTest isn't safe to run from several threads of one process, so each
+simulated user is its own process. Users load their first page, wait for
+each other, then start their turns together. They don't share the
+scheduler or the process-wide caches. Any script exception or failed
+rerun fails the whole run.
+
+    python benchmarks/bench_chat.py --users 20 --output bench.json
+    python benchmarks/bench_chat.py --compare bench.json
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import traceback
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+APP_PATH = REPO_ROOT / "chatbot.py"
+sys.path.insert(0, str(REPO_ROOT))
+
+SCENARIOS = ("quick_prompt", "free_text", "help", "long_conversation")
+
+FREE_TEXT_QUESTIONS = [
+    "What are the top attractions in Dubai?",
+    "How much does the metro cost?",
+    "Where should I stay on a budget?",
+    "What should I wear at the mosque?",
+    "Is Dubai safe at night?",
+]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies):
+    return {
+        "count": len(latencies),
+        "mean_ms": 1000 * sum(latencies) / len(latencies) if latencies else None,
+        "p50_ms": 1000 * percentile(latencies, 50) if latencies else None,
+        "p95_ms": 1000 * percentile(latencies, 95) if latencies else None,
+        "p99_ms": 1000 * percentile(latencies, 99) if latencies else None,
+    }
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate memory held by an object graph"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    elif hasattr(obj, "__slots__"):
+        size += sum(deep_sizeof(getattr(obj, slot), seen) for slot in obj.__slots__ if hasattr(obj, slot))
+    return size
+
+
+def session_memory(app):
+    """Approximate memory held in one session's state, not counting the prefix shared by all sessions"""
+    seen = set()
+    try:
+        prefix = app.session_state["messages"].prefix
+        seen.update(id(message) for message in prefix)
+        seen.add(id(prefix))
+    except (KeyError, AttributeError):
+        pass
+
+    total = 0
+    for key in ("messages", "earlier_messages", "chat_history", "context_window"):
+        try:
+            total += deep_sizeof(app.session_state[key], seen)
+        except KeyError:
+            pass
+    return total
+
+
+class SimulatedUser:
+    """One headless browser session running a scenario"""
+
+    def __init__(self, user_id, scenario, turns, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.user_id = user_id
+        self.scenario = scenario
+        self.turns = turns
+        self.app = AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+        self.latencies = []
+        self.reruns = 0
+
+    def _rerun(self, action):
+        action()
+        self.reruns += 1
+        if self.app.exception:
+            raise RuntimeError(f"User {self.user_id} hit an app exception: {self.app.exception}")
+
+    def _timed(self, action):
+        start = time.perf_counter()
+        self._rerun(action)
+        self.latencies.append(time.perf_counter() - start)
+
+    def _ask(self, text):
+        self._timed(lambda: self.app.chat_input[0].set_value(text).run())
+
+    def load(self):
+        """Load the first page; a rerun too, but not a chat turn"""
+        self._rerun(self.app.run)
+
+    def run(self):
+        if self.scenario == "quick_prompt":
+            index = self.user_id % 5
+            self._timed(lambda: self.app.button(key=f"btn_{index}").click().run())
+        elif self.scenario == "free_text":
+            self._ask(FREE_TEXT_QUESTIONS[self.user_id % len(FREE_TEXT_QUESTIONS)])
+        elif self.scenario == "help":
+            self._ask("help")
+        elif self.scenario == "long_conversation":
+            for turn in range(self.turns):
+                self._ask(f"{FREE_TEXT_QUESTIONS[turn % len(FREE_TEXT_QUESTIONS)]} (turn {turn})")
+        return {"latencies": self.latencies, "reruns": self.reruns, "memory": session_memory(self.app)}
+
+
+def run_user(user_id, scenario, turns, timeout, barrier, results):
+    """Process entry point for one simulated user; puts (user_id, result, error) on the results queue"""
+    try:
+        cpu_start = time.process_time()
+        user = SimulatedUser(user_id, scenario, turns, timeout)
+        user.load()
+        barrier.wait(timeout)
+        started = time.time()
+        result = user.run()
+        result.update(started=started, finished=time.time(), cpu=time.process_time() - cpu_start)
+        results.put((user_id, result, None))
+    except Exception:
+        # Don't leave the other users waiting for this one
+        barrier.abort()
+        results.put((user_id, None, traceback.format_exc()))
+
+
+def run_scenario(scenario, users, turns, timeout):
+    """Run one scenario with `users` concurrent sessions, each in its own process, and summarize it"""
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(users)
+    results_queue = context.Queue()
+    processes = [
+        context.Process(target=run_user, args=(i, scenario, turns, timeout, barrier, results_queue),
+                        name=f"bench-{scenario}-{i}", daemon=True)
+        for i in range(users)
+    ]
+    for process in processes:
+        process.start()
+
+    results, errors = [], []
+    # Startup, the first page and every turn each get the rerun timeout
+    deadline = time.monotonic() + timeout * (turns + 3)
+    while len(results) + len(errors) < users:
+        try:
+            user_id, result, error = results_queue.get(timeout=max(0.1, deadline - time.monotonic()))
+        except queue.Empty:
+            errors.append(f"{users - len(results) - len(errors)} users didn't finish in time")
+            break
+        if error is not None:
+            errors.append(f"User {user_id} failed:\n{error}")
+        else:
+            results.append(result)
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+        elif process.exitcode and not errors:
+            errors.append(f"{process.name} exited with code {process.exitcode}")
+    if errors:
+        raise RuntimeError(f"Scenario {scenario} failed:\n" + "\n".join(errors))
+
+    wall = max(result["finished"] for result in results) - min(result["started"] for result in results)
+    latencies = [latency for result in results for latency in result["latencies"]]
+    reruns = sum(result["reruns"] for result in results)
+    cpu = sum(result["cpu"] for result in results)
+    memory = [result["memory"] for result in results]
+    return {
+        "users": users,
+        "turns": len(latencies),
+        "wall_s": wall,
+        "throughput_turns_per_s": len(latencies) / wall if wall else None,
+        "turn_latency": summarize(latencies),
+        "rerun_cpu_ms": 1000 * cpu / reruns if reruns else None,
+        "session_memory_bytes": {
+            "mean": sum(memory) / len(memory) if memory else None,
+            "max": max(memory) if memory else None,
+        },
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Return the regressions of p95 latency, rerun CPU and memory against a baseline results file"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    regressions = []
+    for scenario, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if not previous:
+            continue
+        checks = (
+            ("turn_latency.p95_ms", current["turn_latency"]["p95_ms"], previous["turn_latency"]["p95_ms"]),
+            ("rerun_cpu_ms", current["rerun_cpu_ms"], previous["rerun_cpu_ms"]),
+            ("session_memory_bytes.mean", current["session_memory_bytes"]["mean"], previous["session_memory_bytes"]["mean"]),
+        )
+        for metric, now, before in checks:
+            if now is not None and before and now > before * (1 + tolerance):
+                regressions.append(f"{scenario} {metric}: {before:.1f} -> {now:.1f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users (processes) per scenario")
+    parser.add_argument("--turns", type=int, default=20, help="turns in the long conversation scenario")
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append", help="scenario to run (default: all)")
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="stub backend delay before the first chunk")
+    parser.add_argument("--stub-tokens-per-sec", type=float, default=200, help="stub backend streaming rate")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per rerun")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", help="baseline results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    # Run the whole app offline against the deterministic stub backend
+    os.environ["DG_BACKEND"] = "stub"
+    os.environ["DG_STUB_LATENCY"] = str(args.stub_latency)
+    os.environ["DG_STUB_TOKENS_PER_SEC"] = str(args.stub_tokens_per_sec)
+    os.environ.setdefault("DG_METRICS_LOG", "")
+    os.environ.setdefault("DG_REQUESTS_PER_MINUTE", "100000")
+    os.environ.setdefault("DG_HISTORY_DB", "")
+
+    results = {
+        "benchmark": "chat",
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {
+            "users": args.users,
+            "turns": args.turns,
+            "stub_latency": args.stub_latency,
+            "stub_tokens_per_sec": args.stub_tokens_per_sec,
+        },
+        "scenarios": {},
+    }
+    for scenario in args.scenario or SCENARIOS:
+        try:
+            results["scenarios"][scenario] = run_scenario(scenario, args.users, args.turns, args.timeout)
+        except RuntimeError as error:
+            print(error, file=sys.stderr)
+            return 1
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
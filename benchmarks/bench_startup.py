@@ -0,0 +1,119 @@
+"""Cold-start benchmark for the Dubai Genie app
+
+Starts a fresh Python process per run, loads chatbot.py with Streamlit's
+AppTest and times process start to first finished page, along with the
+app's own startup profile (DG_PROFILE_STARTUP). The Gemini backend is
+used with a placeholder key, so no request is sent. --eager-sdk imports
+the Gemini SDK before the app, to see what deferring it saves.
+
+    python benchmarks/bench_startup.py --runs 10 --output startup.json
+    python benchmarks/bench_startup.py --compare startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from bench_chat import APP_PATH, REPO_ROOT, summarize
+
+# Runs in the child process; prints its own timings as JSON on the last line
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+if sys.argv[3] == "1":
+    import google.generativeai
+from streamlit.testing.v1 import AppTest
+streamlit_ready = time.perf_counter()
+app = AppTest.from_file(sys.argv[1], default_timeout=float(sys.argv[2]))
+app.run()
+if app.exception:
+    raise SystemExit(f"App exception: {app.exception}")
+done = time.perf_counter()
+print(json.dumps({"streamlit_import": streamlit_ready - start, "first_run": done - streamlit_ready}))
+"""
+
+
+def cold_start(timeout, eager_sdk):
+    """Time one fresh process from spawn to its first finished page"""
+    env = dict(os.environ)
+    env.update({
+        "DG_BACKEND": "gemini",
+        "GOOGLE_API_KEY": env.get("GOOGLE_API_KEY") or "benchmark-placeholder-key",
+        "DG_PROFILE_STARTUP": "1",
+        "DG_METRICS_LOG": "",
+        "DG_HISTORY_DB": "",
+        # The background warm-up starts after the page and would only add noise
+        "DG_WARM_BACKEND": "0",
+    })
+    start = time.perf_counter()
+    child = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT, str(APP_PATH), str(timeout), "1" if eager_sdk else "0"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, timeout=timeout * 2
+    )
+    wall = time.perf_counter() - start
+    if child.returncode != 0:
+        raise RuntimeError(f"Cold start failed:\n{child.stderr.strip()}")
+
+    result = json.loads(child.stdout.strip().splitlines()[-1])
+    result["process_to_first_page"] = wall
+    for line in child.stderr.splitlines():
+        if '"startup_profile"' in line:
+            for phase, seconds in json.loads(line)["startup_profile"].items():
+                result[f"app_{phase}"] = seconds
+    return result
+
+
+def compare(results, baseline_path, tolerance):
+    """Return the cold-start timings that got slower than in a baseline results file"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    regressions = []
+    for metric in ("process_to_first_page", "app_first_render"):
+        now = results["timings"].get(metric, {}).get("p50_ms")
+        before = baseline.get("timings", {}).get(metric, {}).get("p50_ms")
+        if now is not None and before and now > before * (1 + tolerance):
+            regressions.append(f"{metric} p50: {before:.1f} -> {now:.1f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to start")
+    parser.add_argument("--eager-sdk", action="store_true", help="import the Gemini SDK before the app")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per run")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", help="baseline results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    runs = [cold_start(args.timeout, args.eager_sdk) for _ in range(args.runs)]
+    metrics = sorted({metric for run in runs for metric in run})
+    results = {
+        "benchmark": "startup",
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {"runs": args.runs, "eager_sdk": args.eager_sdk},
+        "timings": {
+            metric: summarize([run[metric] for run in runs if run.get(metric) is not None])
+            for metric in metrics
+        },
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,36 @@
+import time
+
+# When this script run started, for the startup profile
+script_start = time.perf_counter()
+
+import json
 import os
+import re
+import sys
 from dotenv import load_dotenv
 import streamlit as st
-import time
-from datetime import datetime
-import google.generativeai as genai
+import threading
+import uuid
+from context_window import ContextWindow, build_history
+from conversation_db import ConversationDB
+from conversation_export import EXPORT_FORMATS, export_conversation, iter_conversation
+from conversation_store import ConversationStore, make_prefix
+from llm_backends import (
+    BackendNotConfiguredError,
+    DeadlineExceededError,
+    InvalidAPIKeyError,
+    ModelNotFoundError,
+    QuotaExceededError,
+    create_backend_from_env,
+)
+from response_cache import config_fingerprint
+from scheduler import RequestScheduler
+from pipeline import create_pipeline_from_env
+from prefetch import PrefetchCache, Prefetcher, predict_follow_ups
+from prompts import get_generation_config, initial_message, model_name, quick_prompts, system_prompt
+from metrics import MetricsRegistry, TurnRecorder, process_uptime, start_metrics_server
+
+imports_done = time.perf_counter()
 
 # Page configuration must be the first Streamlit command
 st.set_page_config(page_title="Dubai Genie", page_icon="🧞", layout="centered")
@@ -11,187 +38,485 @@ st.set_page_config(page_title="Dubai Genie", page_icon="🧞", layout="centered"
 # Load environment variables
 load_dotenv()
 
-# Initialize Google Gemini client
+@st.cache_resource
+def get_conversation_prefix():
+    """Freeze the system prompt and greeting once; every session shares this prefix"""
+    return make_prefix(initial_message)
+
+def new_conversation():
+    """Start an empty conversation over the shared prefix"""
+    return ConversationStore(get_conversation_prefix(), max_turns=int(os.getenv("DG_MAX_TURNS", "500")))
+
+# Number of turns loaded from the history database at a time
+history_page_size = int(os.getenv("DG_HISTORY_PAGE_SIZE", "20"))
+
+@st.cache_resource
+def get_history_db():
+    """Open the conversation history database once per process (DG_HISTORY_DB="" turns it off)"""
+    path = os.getenv("DG_HISTORY_DB", "dubai_genie_history.sqlite3")
+    return ConversationDB(path) if path else None
+
+def add_message(role, content):
+    """Add a turn to this session's conversation and queue it for the history database"""
+    messages = st.session_state.messages
+    messages.append({"role": role, "content": content})
+    # A saved export no longer holds the whole conversation
+    st.session_state.pop("export", None)
+    history_db = get_history_db()
+    if history_db is not None:
+        history_db.append(st.session_state.session_id, len(messages) - len(messages.prefix) - 1, role, content)
+
+def restore_conversation(session_id):
+    """Restore a saved conversation with only its newest page loaded, or return None"""
+    history_db = get_history_db()
+    if history_db is None or not re.fullmatch(r"[0-9a-f]{32}", session_id or ""):
+        return None
+    return history_db.restore(
+        session_id,
+        get_conversation_prefix(),
+        page_size=history_page_size,
+        max_turns=int(os.getenv("DG_MAX_TURNS", "500"))
+    )
+
+# Number of messages rendered at a time in the chat pane
+visible_page_size = int(os.getenv("DG_VISIBLE_MESSAGES", "20"))
+
+def show_earlier_messages():
+    """Render another page of older messages, paging them in from disk once memory runs out"""
+    st.session_state.visible_messages += visible_page_size
+    conversation = st.session_state.messages
+    in_memory = len(st.session_state.earlier_messages) + len(conversation) - conversation.first_turn_index
+    if (st.session_state.visible_messages > in_memory
+            and len(st.session_state.earlier_messages) < conversation.spilled
+            and get_history_db() is not None):
+        load_earlier_messages()
+
+def load_earlier_messages():
+    """Page the next older turns of a restored conversation in from the history database"""
+    earlier = st.session_state.earlier_messages
+    oldest_loaded = st.session_state.messages.spilled - len(earlier)
+    page = get_history_db().load_page(st.session_state.session_id, before=oldest_loaded, limit=history_page_size)
+    st.session_state.earlier_messages = page + earlier
+
+def start_new_conversation():
+    """Start a new conversation under a new session ID"""
+    st.session_state.messages = st.session_state.messages.reset()
+    st.session_state.session_id = uuid.uuid4().hex
+    st.session_state.earlier_messages = []
+    st.session_state.visible_messages = visible_page_size
+    st.session_state.pop("export", None)
+    st.query_params["sid"] = st.session_state.session_id
+    prefetch_follow_ups()
+
+@st.cache_resource
+def get_backend():
+    """Create the model backend once and share it across all sessions"""
+    # DG_BACKEND=stub runs the whole app offline against a simulated model
+    return create_backend_from_env(model_name, get_generation_config(), system_prompt)
+
+@st.cache_resource
+def get_scheduler():
+    """Create the process-wide request scheduler in front of the model backend"""
+    return RequestScheduler(
+        get_backend(),
+        max_concurrent=int(os.getenv("DG_MAX_CONCURRENT", "4")),
+        max_queue=int(os.getenv("DG_MAX_QUEUE", "64")),
+        requests_per_minute=float(os.getenv("DG_REQUESTS_PER_MINUTE", "60")),
+        burst=int(os.getenv("DG_REQUEST_BURST", "5")),
+        max_retries=int(os.getenv("DG_MAX_RETRIES", "3")),
+        timeout=float(os.getenv("DG_REQUEST_TIMEOUT", "60")),
+        hedge_percentile=float(os.getenv("DG_HEDGE_PERCENTILE")) if os.getenv("DG_HEDGE_PERCENTILE") else None
+    )
+
+# Seconds between checks for a newer message while waiting on the model
+reply_heartbeat = 0.25
+
+# Initialize the model backend
 # Check if API key is available
-api_key = os.getenv("GOOGLE_API_KEY")
-if not api_key:
-    st.sidebar.error("⚠️ Google API key not found. Please add your API key to the .env file.")
-    st.sidebar.code("GOOGLE_API_KEY=your_api_key_here", language="text")
-    genai_configured = False
-else:
-    try:
-        genai.configure(api_key=api_key)
-        genai_configured = True
-    except Exception as e:
-        st.sidebar.error(f"⚠️ Error initializing Google Gemini: {str(e)}")
-        genai_configured = False
-
-# System prompt for the Dubai Genie assistant - optimized for simple, easy-to-understand responses
-system_prompt = """
-You are Dubai Genie (DG), a friendly trip planner for Dubai who gives EXTREMELY SIMPLE, EASY-TO-UNDERSTAND answers.
-
-Your knowledge includes:
-- Popular attractions (Burj Khalifa, Dubai Mall, Palm Jumeirah, etc.)
-- Local food and restaurants
-- Cultural customs and etiquette
-- Getting around Dubai
-- Places to stay for all budgets
-- Best times to visit
-- Safety tips
-
-CRITICAL INSTRUCTIONS FOR SIMPLE RESPONSES:
-1. Use VERY SIMPLE LANGUAGE - like you're explaining to a 10-year-old
-2. Keep all responses UNDER 100 WORDS - be extremely brief
-3. Use SHORT SENTENCES with basic vocabulary
-4. Format with BULLET POINTS (•) for easy scanning
-5. Include ONLY 3-5 bullet points maximum
-6. Use NUMBERS for costs (e.g., "150 AED" not "one hundred fifty AED")
-7. AVOID complex terms, jargon, or flowery language
-8. Include ONLY the most essential information
-9. End with ONE simple follow-up question
-
-RESPONSE STRUCTURE (ALWAYS FOLLOW THIS):
-1. One-sentence direct answer to the question
-2. 3-5 bullet points with key information
-3. One practical tip
-4. One simple follow-up question
-
-EXAMPLES OF GOOD RESPONSES:
-
-Question: "What are the top attractions in Dubai?"
-Response:
-"Dubai has 5 must-see attractions that most visitors love.
-
-• Burj Khalifa - World's tallest building (tickets: 150-400 AED)
-• Dubai Mall - Huge shopping center with aquarium and fountain
-• Palm Jumeirah - Man-made island with beaches and hotels
-• Dubai Marina - Waterfront area with restaurants
-• Old Dubai - Historic area with gold and spice markets
-
-Tip: Buy Burj Khalifa tickets online to save money.
-
-Which of these places interests you most?"
-
-Question: "How do I get around Dubai?"
-Response:
-"Dubai has 4 main ways to get around the city.
-
-• Metro - Cheapest option (8-14 AED per trip)
-• Taxi - Most convenient but costs more
-• Bus - Covers areas the metro doesn't
-• Uber - Available but more expensive than taxis
-
-Tip: Get a Nol card for the metro and bus - it saves time and money.
-
-Will you be staying near a metro station?"
-
-Your goal is to make trip planning SUPER EASY with the simplest, most straightforward information possible.
-"""
-
-# Initial messages to start the conversation
-initial_message = [
-    {"role": "system", "content": system_prompt},
-    {
-        "role": "assistant",
-        "content": """👋 Hi! I'm Dubai Genie, your Dubai trip helper. I'll give you simple, easy answers about Dubai.
-
-• Ask about places to visit
-• Ask about costs and budgets
-• Ask about getting around
-• Ask about best times to visit
-
-When are you planning to visit Dubai?"""
-    }
-]
-
-def get_response_from_gemini(messages):
-    """Get a response from the Google Gemini API"""
-    if not genai_configured:
+try:
+    backend = get_backend()
+    backend_ready = backend.configured
+    if not backend_ready:
+        st.sidebar.error("⚠️ Google API key not found. Please add your API key to the .env file.")
+        st.sidebar.code("GOOGLE_API_KEY=your_api_key_here", language="text")
+except Exception as e:
+    st.sidebar.error(f"⚠️ Error initializing Google Gemini: {str(e)}")
+    backend_ready = False
+backend_init_done = time.perf_counter()
+
+def get_error_message(error):
+    """Turn a backend error into a friendly chat message"""
+    error_str = str(error)
+    st.error(f"Error communicating with Google Gemini: {error_str}")
+
+    # Check for specific error types
+    if isinstance(error, QuotaExceededError):
+        return "⚠️ Google API quota exceeded. Please check your Google account billing details or use a different API key."
+    elif isinstance(error, InvalidAPIKeyError):
+        return "⚠️ Invalid API key. Please check your Google API key and make sure it's correctly set in the .env file."
+    elif isinstance(error, ModelNotFoundError):
+        return "⚠️ The requested AI model is not available. Please try a different model or check your Google account access."
+    elif isinstance(error, BackendNotConfiguredError):
         return "Google API key not set. Please check your configuration."
-
-    try:
-        # Convert OpenAI-style messages to Gemini format
-        # Extract only user and assistant messages (skip system message)
-        gemini_messages = []
-        system_content = ""
-
-        for msg in messages:
-            if msg["role"] == "system":
-                system_content = msg["content"]
-            elif msg["role"] == "user":
-                gemini_messages.append({"role": "user", "parts": [msg["content"]]})
-            elif msg["role"] == "assistant":
-                gemini_messages.append({"role": "model", "parts": [msg["content"]]})
-
-        # Initialize the Gemini model
-        model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
-            generation_config={
-                "temperature": 0.7,
-                "top_p": 0.95,
-                "top_k": 40,
-            }
+    elif isinstance(error, DeadlineExceededError):
+        return "⚠️ Dubai Genie took too long to answer. Please try asking again."
+    else:
+        return f"I'm having trouble connecting right now. Error: {error_str}"
+
+@st.cache_resource
+def get_response_fingerprint(backend_model_name):
+    """Fingerprint the model, settings and system prompt once per process"""
+    return config_fingerprint(backend_model_name, get_generation_config(), system_prompt)
+
+# Cached replies are only valid for the exact model, settings and system prompt that produced them
+response_fingerprint = get_response_fingerprint(backend.model_name if backend_ready else model_name)
+
+@st.cache_resource
+def get_answer_pipeline():
+    """Build the process-wide answer pipeline: intent router, day planner, knowledge base, caches and model"""
+    return create_pipeline_from_env(get_scheduler(), response_fingerprint)
+
+def is_first_question(messages):
+    """Check whether the newest message is the first thing the user asked"""
+    if isinstance(messages, ConversationStore):
+        return messages.user_turns == 1
+    return sum(1 for msg in messages if msg["role"] == "user") == 1
+
+def get_context_window():
+    """Return this session's token-budgeted view of the conversation"""
+    if "context_window" not in st.session_state:
+        st.session_state.context_window = ContextWindow(
+            max_tokens=int(os.getenv("DG_CONTEXT_TOKENS", "2000")),
+            summary_tokens=int(os.getenv("DG_SUMMARY_TOKENS", "300"))
         )
+    return st.session_state.context_window
+
+def reset_chat_session():
+    """Forget this session's chat history and context window"""
+    st.session_state.pop("chat_history", None)
+    st.session_state.pop("chat_history_synced", None)
+    st.session_state.pop("context_window", None)
+
+def get_chat_history(messages):
+    """Return the history to send with the newest message, reusing this session's copy when it is in sync"""
+    history = st.session_state.get("chat_history")
+    synced = st.session_state.get("chat_history_synced")
+
+    # Fit the history before the newest message into the token budget
+    window = get_context_window()
+    summary, recent = window.fit(messages, end=len(messages) - 1)
+
+    # The history is in sync when it covers every message but the new one, the
+    # last message it saw is unchanged (the history wasn't cleared or edited)
+    # and no older turns were folded into the summary since it was built
+    if history is not None and synced is not None:
+        synced_count, synced_content, synced_folded = synced
+        if (synced_count == len(messages) - 1
+                and messages[synced_count - 1]["content"] == synced_content
+                and synced_folded == window.folded):
+            return history
+
+    # Otherwise rebuild the history from the summary and the recent turns
+    history = build_history(summary, recent)
+    st.session_state.chat_history = history
+    return history
+
+# Speculative answers to the follow-up questions a reply suggests; off unless DG_PREFETCH=1
+prefetch_enabled = backend_ready and os.getenv("DG_PREFETCH", "").lower() in ("1", "true", "yes")
+
+@st.cache_resource
+def get_prefetcher():
+    """Create the process-wide low-priority pool that prefetches likely next answers"""
+    return Prefetcher(
+        get_scheduler(),
+        workers=int(os.getenv("DG_PREFETCH_WORKERS", "1")),
+        requests_per_minute=float(os.getenv("DG_PREFETCH_PER_MINUTE", "10")),
+        burst=int(os.getenv("DG_PREFETCH_PER_TURN", "3")),
+        max_busy=float(os.getenv("DG_PREFETCH_MAX_BUSY", "0.5")),
+        timeout=float(os.getenv("DG_REQUEST_TIMEOUT", "60"))
+    )
+
+def get_prefetch_cache():
+    """Return this session's prefetched answers for its next turn"""
+    if "prefetch" not in st.session_state:
+        st.session_state.prefetch = PrefetchCache()
+    return st.session_state.prefetch
+
+def prefetch_follow_ups():
+    """Start prefetching answers to the questions the newest reply suggests"""
+    cache = get_prefetch_cache()
+    # Answers prefetched for an earlier reply no longer fit the conversation
+    cache.clear()
+    messages = st.session_state.messages
+    if not prefetch_enabled or messages[-1]["role"] != "assistant":
+        return
 
-        # If this is the first message, include the system prompt
-        if len(gemini_messages) <= 1 and system_content:
-            # For Gemini, we'll add the system prompt as a preamble to the first user message
-            if gemini_messages and gemini_messages[0]["role"] == "user":
-                gemini_messages[0]["parts"][0] = f"[System Instructions: {system_content}]\n\nUser query: {gemini_messages[0]['parts'][0]}"
+    # Questions answered locally are already instant
+    pipeline = get_answer_pipeline()
+    follow_ups = [
+        follow_up for follow_up in predict_follow_ups(messages[-1]["content"], limit=int(os.getenv("DG_PREFETCH_PER_TURN", "3")))
+        if not pipeline.answered_locally(follow_up.question, first_question=messages.user_turns == 0)
+    ]
+    if not follow_ups:
+        return
 
-        # Create a chat session
-        chat = model.start_chat(history=gemini_messages[:-1] if gemini_messages else [])
+    summary, recent = get_context_window().fit(messages, end=len(messages))
+    history = build_history(summary, recent)
+    for follow_up in follow_ups:
+        get_prefetcher().submit(cache, history, follow_up, message=pipeline.model_message(follow_up.question),
+                                finish=pipeline.shape)
+
+@st.cache_resource
+def get_turn_recorder():
+    """Create the process-wide per-turn metrics, optionally served on a local /metrics endpoint"""
+    registry = MetricsRegistry()
+    registry.gauge("dg_scheduler_queue_depth", lambda: get_scheduler().stats()["queue_depth"],
+                   "Requests waiting for a model worker")
+    registry.gauge("dg_scheduler_in_flight", lambda: get_scheduler().stats()["in_flight"],
+                   "Model requests currently running")
+    pipeline = get_answer_pipeline()
+    registry.gauge("dg_response_cache_size", lambda: len(pipeline.cache),
+                   "Entries in the response cache")
+    if pipeline.similar is not None:
+        registry.gauge("dg_semantic_index_size", lambda: len(pipeline.similar),
+                       "Answered questions in the similarity index")
+    for counter in ("cancelled", "deadline_exceeded", "hedged", "hedge_wins"):
+        registry.gauge(f"dg_scheduler_{counter}", lambda counter=counter: get_scheduler().stats()[counter],
+                       f"Model requests {counter.replace('_', ' ')} so far")
+    if pipeline.router is not None:
+        registry.gauge("dg_intent_routed_ratio", lambda: pipeline.router.stats()["routed_ratio"],
+                       "Share of messages answered by the local intent router")
+    if prefetch_enabled:
+        for counter in ("pending", "submitted", "completed", "failed", "skipped_busy", "skipped_budget"):
+            registry.gauge(f"dg_prefetch_{counter}", lambda counter=counter: get_prefetcher().stats()[counter],
+                           f"Follow-up prefetches {counter.replace('_', ' ')}")
+
+    metrics_port = os.getenv("DG_METRICS_PORT")
+    if metrics_port:
+        start_metrics_server(registry, int(metrics_port), host=os.getenv("DG_METRICS_HOST", "127.0.0.1"))
+
+    return TurnRecorder(registry, log_path=os.getenv("DG_METRICS_LOG", "dubai_genie_turns.jsonl"))
+
+def stream_response_from_gemini(messages, turn=None):
+    """Stream a response from the model backend, yielding text chunks as they arrive
+
+    If a turn dict is given, it is filled in with the cache hit, timings,
+    token usage and error class of this response.
+    """
+    turn = {} if turn is None else turn
+    turn["cache_hit"] = False
+    pipeline = get_answer_pipeline()
+
+    # Router, planner, knowledge base and cached answers never reach the model
+    if messages and messages[-1]["role"] == "user":
+        answer = pipeline.answer_locally(messages[-1]["content"], is_first_question(messages), turn)
+        if answer is not None:
+            yield answer
+            return
+
+    if not backend_ready:
+        turn["error"] = "BackendNotConfiguredError"
+        yield "Google API key not set. Please check your configuration."
+        return
 
-        # Get response
-        if gemini_messages:
-            last_msg = gemini_messages[-1]
-            response = chat.send_message(last_msg["parts"][0])
-            return response.text
-        else:
-            # If no messages, return a default greeting
-            return "Hello! I'm Dubai Genie, your personal Dubai trip planner. How can I help you today?"
+    if not messages or messages[-1]["role"] != "user":
+        # If there is no new question, return a default greeting
+        yield "Hello! I'm Dubai Genie, your personal Dubai trip planner. How can I help you today?"
+        return
+
+    # A follow-up the last reply suggested may already be answered, or on its way
+    question = messages[-1]["content"]
+    flight_key = None
+    if prefetch_enabled:
+        prefetched = get_prefetch_cache().match(question)
+        if prefetched is not None:
+            if prefetched.text is not None:
+                turn["prefetch"] = "ready"
+                yield prefetched.text
+                return
+            # Still generating: share its request instead of sending another
+            turn["prefetch"] = "joined"
+            flight_key = prefetched.key
+
+    try:
+        # The system prompt travels as the model's system instruction, not in the history
+        prepare_start = time.perf_counter()
+        history = get_chat_history(messages)
+        turn["prepare"] = time.perf_counter() - prepare_start
+
+        # Stream the shaped reply chunk by chunk; heartbeats are passed on so
+        # the page can notice a newer message while the model is silent
+        parts = []
+        for chunk in pipeline.stream_reply(history, question, is_first_question(messages), turn,
+                                           flight_key=flight_key, heartbeat=reply_heartbeat):
+            parts.append(chunk)
+            yield chunk
+        text = "".join(parts)
+
+        # The history now also holds this question and the reply as shown
+        history.append(messages[-1])
+        history.append({"role": "assistant", "content": text})
+        st.session_state.chat_history_synced = (len(messages) + 1, text, get_context_window().folded)
+
+        # Keep the token counts of the last reply, including those served from the cached system prompt
+        usage = turn.pop("usage", None)
+        if usage:
+            st.session_state.last_usage = usage
+            turn.update(usage)
 
     except Exception as e:
-        error_str = str(e)
-        st.error(f"Error communicating with Google Gemini: {error_str}")
-
-        # Check for specific error types
-        if "quota" in error_str.lower():
-            return "⚠️ Google API quota exceeded. Please check your Google account billing details or use a different API key."
-        elif "invalid" in error_str.lower() and "key" in error_str.lower():
-            return "⚠️ Invalid API key. Please check your Google API key and make sure it's correctly set in the .env file."
-        elif "model" in error_str.lower() and "not found" in error_str.lower():
-            return "⚠️ The requested AI model is not available. Please try a different model or check your Google account access."
-        else:
-            return f"I'm having trouble connecting right now. Error: {error_str}"
-
-def export_conversation():
-    """Export the current conversation to a text file"""
-    if len(st.session_state.messages) <= 2:  # Only system message and initial assistant message
-        st.warning("No conversation to export yet!")
-        return
+        # Drop the history so the next turn rebuilds it from a clean copy
+        st.session_state.pop("chat_history", None)
+        st.session_state.pop("chat_history_synced", None)
+        turn["error"] = type(e).__name__
+        yield get_error_message(e)
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"dubai_genie_conversation_{timestamp}.txt"
+def get_response_from_gemini(messages):
+    """Get a complete response from the model backend"""
+    return "".join(stream_response_from_gemini(messages))
 
-    with open(filename, "w") as f:
-        f.write("Dubai Genie Conversation Export\n")
-        f.write(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+def warm_up_quick_prompt(prompt):
+    """Generate and cache the first-turn answer for one quick prompt"""
+    pipeline = get_answer_pipeline()
+    if pipeline.cache_key(prompt) in pipeline.cache:
+        return
 
-        for message in st.session_state.messages:
-            if message["role"] != "system":
-                role = "Dubai Genie" if message["role"] == "assistant" else "You"
-                f.write(f"{role}: {message['content']}\n\n")
+    # Generate without history so no session state is touched from the background thread
+    for _ in pipeline.stream_reply([], prompt, True, {}):
+        pass
+
+@st.cache_resource
+def start_cache_warm_up():
+    """Pre-generate the quick-prompt answers once per process in the background"""
+    def warm_up():
+        for prompt_data in quick_prompts:
+            try:
+                warm_up_quick_prompt(f"{prompt_data['icon']} {prompt_data['text']}")
+            except Exception:
+                # Warm-up is best effort; the prompt will be answered live instead
+                pass
+
+    thread = threading.Thread(target=warm_up, name="dg-cache-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+if backend_ready and os.getenv("DG_WARM_CACHE", "").lower() in ("1", "true", "yes"):
+    start_cache_warm_up()
+
+# Thinking indicator shown until the first chunk of a reply arrives
+thinking_html = '''
+<div class="thinking" style="display: flex; align-items: center; margin: 10px 0; padding: 10px;
+border-radius: 10px; background: linear-gradient(135deg, rgba(71, 118, 230, 0.05), rgba(142, 84, 233, 0.05));">
+    <div style="width: 20px; height: 20px; border-radius: 50%; margin-right: 10px;
+    background: linear-gradient(45deg, #4776E6, #8E54E9); animation: pulse 1s infinite alternate;"></div>
+    <div>Dubai Genie is crafting a simple response for you...</div>
+</div>
+'''
+
+def new_turn(source):
+    """Start the metrics record for one chat turn"""
+    return {
+        "session": st.session_state.session_id,
+        "source": source,
+        "history_render": st.session_state.get("last_history_render"),
+    }
 
-    return filename
+def stream_assistant_reply(messages, source="chat"):
+    """Render the assistant reply as it streams in and return the full text"""
+    turn = new_turn(source)
+    with st.chat_message("assistant", avatar="🧞"):
+        # Show the thinking indicator until the first chunk arrives
+        thinking = st.empty()
+        thinking.markdown(thinking_html, unsafe_allow_html=True)
+        start_time = time.perf_counter()
+
+        def timed_chunks():
+            # Time spent waiting on the backend; the rest of the turn is rendering
+            waiting = 0.0
+            chunks = stream_response_from_gemini(messages, turn)
+            while True:
+                wait_start = time.perf_counter()
+                chunk = next(chunks, None)
+                waiting += time.perf_counter() - wait_start
+                if chunk is None:
+                    break
+                if not chunk:
+                    # Nothing from the model yet. Touching the page lets Streamlit stop
+                    # this run if a newer message came in, which cancels the request
+                    if "ttft" not in turn:
+                        thinking.markdown(thinking_html, unsafe_allow_html=True)
+                    continue
+                if "ttft" not in turn:
+                    # Time-to-first-token is the latency the user actually sees
+                    turn["ttft"] = time.perf_counter() - start_time
+                    st.session_state.last_ttft = turn["ttft"]
+                    thinking.empty()
+                yield chunk
+            turn["generation"] = time.perf_counter() - start_time
+            turn["waiting"] = waiting
+            thinking.empty()
+
+        response = st.write_stream(timed_chunks())
+
+    turn["total"] = time.perf_counter() - start_time
+    turn["render"] = turn["total"] - turn.pop("waiting", 0.0)
+    get_turn_recorder().record(turn)
+
+    # write_stream returns a list when nothing was streamed
+    if not isinstance(response, str):
+        response = "".join(str(part) for part in response)
+    return response
+
+def prepare_export(fmt):
+    """Serialize this session's conversation, including turns only on disk, for the download button"""
+    conversation = iter_conversation(st.session_state.messages, get_history_db(), st.session_state.session_id)
+    st.session_state.export = export_conversation(conversation, fmt)
+
+def save_controls():
+    """Save and download the conversation; drawn in the chat pane so it is redrawn after every turn"""
+    with st.popover("📥 Save chat"):
+        st.selectbox("Save as", list(EXPORT_FORMATS), key="export_format",
+                     format_func={"txt": "Plain text", "md": "Markdown", "jsonl": "JSON Lines"}.get)
+        if st.button("📥 Save", key="export_btn"):
+            if len(st.session_state.messages) > 2:
+                prepare_export(st.session_state.export_format)
+            else:
+                st.warning("Nothing to save yet")
+
+        # The export is built in memory and handed to the browser; nothing is written on the server
+        export = st.session_state.get("export")
+        if export is not None:
+            filename, mime, data = export
+            st.download_button("⬇️ Download chat", data=data, file_name=filename, mime=mime, key="download_btn")
 
 # Initialize session state variables
 if "messages" not in st.session_state:
-    st.session_state.messages = initial_message
+    # On reconnect, pick up the conversation named in the URL
+    restored = restore_conversation(st.query_params.get("sid"))
+    if restored is not None:
+        st.session_state.messages = restored
+        st.session_state.session_id = st.query_params.get("sid")
+        st.session_state.conversation_started = True
+    else:
+        st.session_state.messages = new_conversation()
+
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+    st.query_params["sid"] = st.session_state.session_id
+
+if "earlier_messages" not in st.session_state:
+    st.session_state.earlier_messages = []
+
+if "visible_messages" not in st.session_state:
+    st.session_state.visible_messages = visible_page_size
 
 if "conversation_started" not in st.session_state:
     st.session_state.conversation_started = False
 
+# Prefetch what the greeting (or the restored conversation's last reply) suggests asking
+if "prefetch" not in st.session_state:
+    prefetch_follow_ups()
+
 # Function to handle quick prompt selection
 def handle_quick_prompt(prompt):
     # Just set the flag, we'll add the message in the main flow
@@ -421,14 +746,6 @@ with st.sidebar:
     st.markdown('<div class="sidebar-header">✨ Quick Questions</div>', unsafe_allow_html=True)
     st.markdown('<div class="quick-question-container">', unsafe_allow_html=True)
 
-    quick_prompts = [
-        {"icon": "🏙️", "text": "What are the top 5 attractions?"},
-        {"icon": "🌡️", "text": "When is the best time to visit?"},
-        {"icon": "💰", "text": "What can I do for under 100 AED?"},
-        {"icon": "🚕", "text": "What's the cheapest way to get around?"},
-        {"icon": "👋", "text": "What are 3 important local customs?"}
-    ]
-
     for i, prompt_data in enumerate(quick_prompts):
         prompt = f"{prompt_data['icon']} {prompt_data['text']}"
         col1, col2 = st.columns([1, 5])
@@ -445,20 +762,11 @@ with st.sidebar:
     # Enhanced conversation management with visual styling
     st.markdown('<div class="sidebar-header">💬 Conversation</div>', unsafe_allow_html=True)
 
-    col1, col2 = st.columns(2)
-    with col1:
-        if st.button("🗑️ Clear", key="clear_btn"):
-            st.session_state.messages = initial_message
-            st.session_state.conversation_started = False
-            st.success("Conversation cleared!")
-
-    with col2:
-        if st.button("📥 Save", key="export_btn"):
-            if len(st.session_state.messages) > 2:
-                filename = export_conversation()
-                st.success(f"Chat saved!")
-            else:
-                st.warning("Nothing to save yet")
+    if st.button("🗑️ Clear", key="clear_btn"):
+        start_new_conversation()
+        st.session_state.conversation_started = False
+        reset_chat_session()
+        st.success("Conversation cleared!")
 
     # Add a helpful tip
     st.markdown('''
@@ -489,8 +797,8 @@ st.markdown('''
 # Chat container with enhanced design
 st.markdown("<div class='chat-container'></div>", unsafe_allow_html=True)
 
-# Display chat messages with minimal styling
-for message in st.session_state.messages:
+def render_message(message):
+    """Show one chat message with its avatar"""
     if message["role"] != "system":
         # Use minimal avatars
         avatar = None
@@ -502,96 +810,114 @@ for message in st.session_state.messages:
         with st.chat_message(message["role"], avatar=avatar):
             st.markdown(message["content"])
 
-# Check if a quick prompt was selected
-if "quick_prompt_selected" in st.session_state:
-    prompt = st.session_state.quick_prompt_selected
-
-    # Add the prompt to messages
-    st.session_state.messages.append({"role": "user", "content": prompt})
-
-    # Display the selected prompt with user avatar
-    with st.chat_message("user", avatar="👤"):
-        st.markdown(prompt)
-
-    # Show an enhanced spinner with custom message
-    with st.spinner(""):
-        st.markdown('''
-        <div class="thinking" style="display: flex; align-items: center; margin: 10px 0; padding: 10px;
-        border-radius: 10px; background: linear-gradient(135deg, rgba(71, 118, 230, 0.05), rgba(142, 84, 233, 0.05));">
-            <div style="width: 20px; height: 20px; border-radius: 50%; margin-right: 10px;
-            background: linear-gradient(45deg, #4776E6, #8E54E9); animation: pulse 1s infinite alternate;"></div>
-            <div>Dubai Genie is crafting a simple response for you...</div>
-        </div>
-        ''', unsafe_allow_html=True)
-
-        # Get response from Google Gemini
-        response = get_response_from_gemini(st.session_state.messages)
-
-        # Add a small delay to make the typing effect more realistic
-        time.sleep(0.8)
+@st.fragment
+def chat_pane():
+    """The conversation and chat input; reruns on its own so a turn doesn't repaint the whole page"""
+    # Display chat messages with minimal styling
+    history_render_start = time.perf_counter()
+    conversation = st.session_state.messages
+    earlier = st.session_state.earlier_messages
+    for message in conversation.prefix:
+        render_message(message)
+
+    # Only the newest messages are rendered; older ones wait behind "Show earlier"
+    visible = st.session_state.visible_messages
+    live_count = len(conversation) - conversation.first_turn_index
+    more_on_disk = len(earlier) < conversation.spilled and get_history_db() is not None
+    if len(earlier) + live_count > visible or more_on_disk:
+        st.button("⬆️ Show earlier messages", key="show_earlier_btn", on_click=show_earlier_messages)
+
+    if visible > live_count:
+        for message in earlier[max(0, len(earlier) - (visible - live_count)):]:
+            render_message(message)
+    for message in conversation[len(conversation) - min(visible, live_count):]:
+        render_message(message)
+    st.session_state.last_history_render = time.perf_counter() - history_render_start
+
+    # Check if a quick prompt was selected
+    if "quick_prompt_selected" in st.session_state:
+        prompt = st.session_state.quick_prompt_selected
+
+        # Add the prompt to messages
+        add_message("user", prompt)
+
+        # Display the selected prompt with user avatar
+        with st.chat_message("user", avatar="👤"):
+            st.markdown(prompt)
+
+        # Stream the response from Google Gemini
+        response = stream_assistant_reply(st.session_state.messages, source="quick_prompt")
 
         # Add assistant response to chat
-        st.session_state.messages.append({"role": "assistant", "content": response})
-
-    # Display assistant response
-    with st.chat_message("assistant", avatar="🧞"):
-        st.markdown(response)
-
-    # Clear the selected prompt so it doesn't repeat
-    del st.session_state.quick_prompt_selected
-
-    # Force a rerun to prevent duplicate processing
-    st.rerun()
-
-# Chat input with enhanced styling and more inviting placeholder
-user_message = st.chat_input("Ask about attractions, activities, or type 'help' for suggestions...")
-
-if user_message:
-    # Add user message to chat
-    st.session_state.messages.append({"role": "user", "content": user_message})
-    st.session_state.conversation_started = True
-
-    with st.chat_message("user", avatar="👤"):
-        st.markdown(user_message)
-
-    # Show an enhanced spinner with custom message
-    with st.spinner(""):
-        st.markdown('''
-        <div class="thinking" style="display: flex; align-items: center; margin: 10px 0; padding: 10px;
-        border-radius: 10px; background: linear-gradient(135deg, rgba(71, 118, 230, 0.05), rgba(142, 84, 233, 0.05));">
-            <div style="width: 20px; height: 20px; border-radius: 50%; margin-right: 10px;
-            background: linear-gradient(45deg, #4776E6, #8E54E9); animation: pulse 1s infinite alternate;"></div>
-            <div>Dubai Genie is crafting a simple response for you...</div>
-        </div>
-        ''', unsafe_allow_html=True)
-
-        # Special handling for 'help' command
-        if user_message.lower().strip() == 'help':
-            response = """
-            **Quick Help Guide**
+        add_message("assistant", response)
+        prefetch_follow_ups()
 
-            Try asking me these simple questions:
+        # Clear the selected prompt so it doesn't repeat
+        del st.session_state.quick_prompt_selected
 
-            • "What are the top 5 attractions in Dubai?"
-            • "How much does a day in Dubai cost?"
-            • "What's the best time to visit Dubai?"
-            • "How do I get around Dubai?"
-            • "What should I pack for Dubai?"
+    # Chat input with enhanced styling and more inviting placeholder
+    user_message = st.chat_input("Ask about attractions, activities, or type 'help' for suggestions...")
 
-            Tip: Ask one specific question at a time for the best answers.
+    if user_message:
+        # Add user message to chat
+        add_message("user", user_message)
+        st.session_state.conversation_started = True
 
-            What would you like to know about Dubai?
-            """
-        else:
-            # Get response from Google Gemini
-            response = get_response_from_gemini(st.session_state.messages)
+        with st.chat_message("user", avatar="👤"):
+            st.markdown(user_message)
 
-        # Add a small delay to make the typing effect more realistic
-        time.sleep(0.8)
+        # Stream the response; 'help' and small talk are answered locally
+        response = stream_assistant_reply(st.session_state.messages)
 
         # Add assistant response to chat
-        st.session_state.messages.append({"role": "assistant", "content": response})
-
-    # Display assistant response
-    with st.chat_message("assistant", avatar="🧞"):
-        st.markdown(response)
+        add_message("assistant", response)
+        prefetch_follow_ups()
+
+    save_controls()
+
+chat_pane()
+
+@st.cache_resource
+def start_backend_warm_up():
+    """Import the model SDK and set up its client in the background, once per process"""
+    def warm_up():
+        try:
+            get_backend().warm_up()
+        except Exception:
+            # Best effort; the first request does the setup instead
+            pass
+
+    thread = threading.Thread(target=warm_up, name="dg-backend-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_resource
+def get_startup_profile():
+    """Timings of the first script run in this process, filled in by report_startup_profile"""
+    return {}
+
+def report_startup_profile():
+    """Log how long the first page of this process took, as JSON on stderr and as metrics gauges"""
+    profile = get_startup_profile()
+    if profile:
+        return
+    import llm_backends
+    profile.update({
+        "imports": imports_done - script_start,
+        "backend_init": backend_init_done - imports_done,
+        "first_render": time.perf_counter() - script_start,
+        "process_uptime": process_uptime(),
+        "sdk_import": llm_backends.sdk_import_seconds,
+    })
+    print(json.dumps({"startup_profile": profile}), file=sys.stderr)
+    registry = get_turn_recorder().registry
+    for phase, seconds in profile.items():
+        if seconds is not None:
+            registry.gauge(f"dg_startup_{phase}_seconds", lambda seconds=seconds: seconds, f"Startup {phase.replace('_', ' ')} time")
+
+# The page is drawn by now, so the slow SDK setup no longer delays it
+if backend_ready and os.getenv("DG_WARM_BACKEND", "1") != "0":
+    start_backend_warm_up()
+
+if os.getenv("DG_PROFILE_STARTUP", "").lower() in ("1", "true", "yes"):
+    report_startup_profile()
@@ -0,0 +1,107 @@
+import re
+
+
+def estimate_tokens(text):
+    """Roughly estimate the token count of a text (about 4 characters per token for English)"""
+    return max(1, (len(text) + 3) // 4)
+
+
+def first_sentence(text, max_words=25):
+    """Return the first sentence of a text, cut to max_words"""
+    text = " ".join(text.split())
+    sentence = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    words = sentence.split()
+    if len(words) > max_words:
+        sentence = " ".join(words[:max_words]) + "..."
+    return sentence
+
+
+def fold_into_summary(summary, messages, max_tokens, count_tokens=estimate_tokens):
+    """Add the gist of newly folded messages to a running summary, dropping the oldest lines past max_tokens"""
+    lines = summary.splitlines() if summary else []
+    for msg in messages:
+        if msg["role"] == "user":
+            lines.append(f"- User asked: {first_sentence(msg['content'])}")
+        elif msg["role"] == "assistant":
+            lines.append(f"- Dubai Genie answered: {first_sentence(msg['content'])}")
+
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def build_history(summary, recent):
+    """Return the history to send: a summary exchange for folded turns, then the recent turns"""
+    history = []
+    if summary:
+        history.append({"role": "user", "content": f"Summary of our earlier conversation:\n{summary}"})
+        history.append({"role": "assistant", "content": "Thanks, I'll keep that in mind."})
+    history.extend(recent)
+    return history
+
+
+class ContextWindow:
+    """Token-budgeted view of a conversation: recent turns verbatim, older turns in a rolling summary
+
+    Token counts are cached per message and only newly folded messages are
+    added to the summary, so the work per turn depends on the size of the
+    window rather than the length of the conversation.
+    """
+
+    def __init__(self, max_tokens=2000, summary_tokens=300, count_tokens=estimate_tokens):
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.count_tokens = count_tokens
+        self.reset()
+
+    def reset(self):
+        self.summary = ""
+        self.folded = 0
+        self._token_counts = []
+
+    def fit(self, messages, end=None):
+        """Return (summary, recent) for messages[:end], where recent fits in the token budget
+
+        System messages are never counted or returned. The recent window
+        always starts on a user message so turns stay paired.
+        """
+        end = len(messages) if end is None else end
+        if end < len(self._token_counts) or end < self.folded:
+            # The history got shorter, so it was cleared or edited
+            self.reset()
+
+        # Messages a conversation store has spilled out of memory (before
+        # history_start) are never sent; they only hold their indexes
+        history_start = min(getattr(messages, "history_start", 0), end)
+        if len(self._token_counts) < history_start:
+            self._token_counts.extend([0] * (history_start - len(self._token_counts)))
+        for msg in messages[len(self._token_counts):end]:
+            tokens = 0 if msg["role"] == "system" else self.count_tokens(msg["content"])
+            self._token_counts.append(tokens)
+
+        # Walk back from the newest message while the turns still fit, stopping
+        # at the spilled messages
+        floor = max(self.folded, history_start)
+        budget = self.max_tokens - self.summary_tokens
+        used = 0
+        start = end
+        while start > floor and used + self._token_counts[start - 1] <= budget:
+            start -= 1
+            used += self._token_counts[start]
+
+        if start > self.folded:
+            while start < end and messages[start]["role"] != "user":
+                start += 1
+            self.summary = fold_into_summary(
+                self.summary, messages[self.folded:start], self.summary_tokens, self.count_tokens
+            )
+            self.folded = start
+
+        recent = [msg for msg in messages[start:end] if msg["role"] != "system"]
+        return self.summary, recent
+
+    def prompt_tokens(self, messages, end=None):
+        """Estimate the tokens the windowed history would send"""
+        summary, recent = self.fit(messages, end)
+        summary_tokens = self.count_tokens(summary) if summary else 0
+        return summary_tokens + sum(self.count_tokens(msg["content"]) for msg in recent)
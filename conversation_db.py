@@ -0,0 +1,153 @@
+import atexit
+import sqlite3
+import threading
+import time
+
+from conversation_store import ConversationStore, Message
+
+
+class ConversationDB:
+    """Durable conversation history in a local SQLite database
+
+    Turns are queued in memory and written in batches by a background
+    thread, either every flush_interval seconds or as soon as batch_size
+    turns are waiting. The database runs in WAL mode so page loads never
+    wait on the writer. History is read back one page at a time, newest
+    first, so restoring a long conversation only reads what is shown.
+    """
+
+    def __init__(self, path, batch_size=20, flush_interval=1.0, timeout=5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS turns (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID;
+            """
+        )
+
+        self._writer = threading.Thread(target=self._write_loop, name="dg-history-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, session_id, seq, role, content):
+        """Queue one turn for writing; seq is the turn's position in its conversation"""
+        with self._pending_lock:
+            self._pending.append((session_id, seq, role, content, time.time()))
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write every queued turn in one transaction"""
+        with self._write_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO turns (session_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                    batch,
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                # Put the batch back so the next flush retries it
+                with self._pending_lock:
+                    self._pending = batch + self._pending
+                raise
+
+    def _write_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                # The batch stays queued; try again on the next tick
+                pass
+
+    def count(self, session_id):
+        """Return (number of turns, number of user turns) stored for a conversation"""
+        self.flush()
+        row = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(role = 'user'), 0) FROM turns WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row[0], row[1]
+
+    def load_page(self, session_id, before=None, limit=20):
+        """Return up to `limit` turns older than seq `before` (or the newest ones), oldest first"""
+        self.flush()
+        if before is None:
+            before = 2 ** 62
+        rows = self._connect().execute(
+            "SELECT role, content FROM turns WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+            (session_id, before, limit),
+        ).fetchall()
+        return [Message(role, content) for role, content in reversed(rows)]
+
+    def iter_turns(self, session_id, before=None, batch_size=200):
+        """Yield a conversation's turns older than seq `before` (or all of them), oldest first
+
+        Rows are read from one cursor batch_size at a time, so a long
+        history is never held in memory at once.
+        """
+        self.flush()
+        if before is None:
+            before = 2 ** 62
+        cursor = self._connect().execute(
+            "SELECT role, content FROM turns WHERE session_id = ? AND seq < ? ORDER BY seq",
+            (session_id, before),
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for role, content in rows:
+                yield Message(role, content)
+
+    def restore(self, session_id, prefix, page_size=20, max_turns=500):
+        """Rebuild a conversation with only its newest page in memory, or return None if it is unknown
+
+        Older turns are left on disk and counted as spilled, so indexes
+        stay absolute and they can be paged in with load_page later.
+        """
+        total, user_turns = self.count(session_id)
+        if not total:
+            return None
+
+        page = self.load_page(session_id, limit=page_size)
+        store = ConversationStore(prefix, max_turns=max_turns)
+        store.spilled = total - len(page)
+        for message in page:
+            store.append(message)
+        store.user_turns = user_turns
+        return store
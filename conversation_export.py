@@ -0,0 +1,66 @@
+import io
+import json
+from datetime import datetime
+
+ROLE_NAMES = {"assistant": "Dubai Genie", "user": "You"}
+
+# Format name -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "txt": ("txt", "text/plain"),
+    "md": ("md", "text/markdown"),
+    "jsonl": ("jsonl", "application/x-ndjson"),
+}
+
+
+def iter_conversation(store, history_db=None, session_id=None):
+    """Yield every message of a conversation but the system prompt, oldest first
+
+    Turns spilled out of memory are streamed from the history database
+    when one is given; without it they are left out.
+    """
+    for message in store.prefix:
+        if message.role != "system":
+            yield message
+    if store.spilled and history_db is not None:
+        yield from history_db.iter_turns(session_id, before=store.spilled)
+    yield from store.turns()
+
+
+def _text_lines(messages, generated_at):
+    yield "Dubai Genie Conversation Export\n"
+    yield f"Generated on: {generated_at:%Y-%m-%d %H:%M:%S}\n\n"
+    for message in messages:
+        yield f"{ROLE_NAMES.get(message.role, message.role)}: {message.content}\n\n"
+
+
+def _markdown_lines(messages, generated_at):
+    yield "# Dubai Genie Conversation\n\n"
+    yield f"_Generated on {generated_at:%Y-%m-%d %H:%M:%S}_\n\n"
+    for message in messages:
+        yield f"### {ROLE_NAMES.get(message.role, message.role)}\n\n{message.content.strip()}\n\n"
+
+
+def _jsonl_lines(messages, generated_at):
+    for seq, message in enumerate(messages):
+        yield json.dumps({"seq": seq, "role": message.role, "content": message.content}, ensure_ascii=False) + "\n"
+
+
+_SERIALIZERS = {"txt": _text_lines, "md": _markdown_lines, "jsonl": _jsonl_lines}
+
+
+def export_conversation(messages, fmt="txt", generated_at=None):
+    """Serialize messages into an in-memory file; returns (file name, MIME type, bytes)
+
+    Each message is encoded and appended to the buffer as it is read, so
+    the export takes one pass over the conversation and nothing is
+    written to disk.
+    """
+    if fmt not in _SERIALIZERS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+    generated_at = generated_at or datetime.now()
+    extension, mime = EXPORT_FORMATS[fmt]
+
+    buffer = io.BytesIO()
+    for line in _SERIALIZERS[fmt](messages, generated_at):
+        buffer.write(line.encode("utf-8"))
+    return f"dubai_genie_conversation_{generated_at:%Y%m%d_%H%M%S}.{extension}", mime, buffer.getvalue()
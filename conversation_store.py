@@ -0,0 +1,143 @@
+class Message:
+    """Immutable chat message that also supports dict-style access (message["role"])"""
+
+    __slots__ = ("role", "content")
+
+    def __init__(self, role, content):
+        object.__setattr__(self, "role", role)
+        object.__setattr__(self, "content", content)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Messages are immutable")
+
+    def __getitem__(self, key):
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if isinstance(other, (Message, dict)):
+            return self.role == other["role"] and self.content == other["content"]
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.role, self.content))
+
+    def __reduce__(self):
+        return (Message, (self.role, self.content))
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content[:40]!r})"
+
+    def to_dict(self):
+        return {"role": self.role, "content": self.content}
+
+
+def make_prefix(messages):
+    """Freeze the opening messages every conversation shares (system prompt and greeting)"""
+    return tuple(Message(msg["role"], msg["content"]) for msg in messages)
+
+
+class ConversationStore:
+    """One session's conversation: a shared immutable prefix plus this session's own turns
+
+    The prefix tuple is shared by every session and never copied or
+    mutated; resetting a conversation just starts a new store over the
+    same prefix. Turns are kept as slotted Message objects up to
+    max_turns. Past that, the oldest turns are spilled: handed to the
+    spill callback (if any) and dropped from memory. Indexes stay
+    absolute, so len() counts spilled turns too and reading a spilled
+    index raises IndexError; iteration and slices skip them.
+    """
+
+    __slots__ = ("prefix", "max_turns", "spill", "spilled", "user_turns", "_turns")
+
+    def __init__(self, prefix, max_turns=500, spill=None):
+        self.prefix = prefix
+        self.max_turns = max_turns
+        self.spill = spill
+        self.spilled = 0
+        self.user_turns = 0
+        self._turns = []
+
+    def __reduce__(self):
+        state = (self.spilled, self.user_turns, self._turns)
+        return (_restore_store, (self.prefix, self.max_turns, state))
+
+    @property
+    def first_turn_index(self):
+        """Absolute index of the oldest turn still in memory"""
+        return len(self.prefix) + self.spilled
+
+    @property
+    def history_start(self):
+        """Absolute index where the unbroken run of readable messages ending at the newest one begins"""
+        return self.first_turn_index if self.spilled else 0
+
+    def __len__(self):
+        return self.first_turn_index + len(self._turns)
+
+    def _get(self, index):
+        if index < len(self.prefix):
+            return self.prefix[index]
+        if index < self.first_turn_index:
+            raise IndexError(f"Message {index} was spilled out of memory")
+        return self._turns[index - self.first_turn_index]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            # Spilled messages are skipped rather than raising
+            first = self.first_turn_index
+            head = list(self.prefix[start:min(stop, len(self.prefix))])
+            tail = self._turns[max(start, first) - first:max(stop, first) - first]
+            return head + tail
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Message index out of range")
+        return self._get(index)
+
+    def __iter__(self):
+        yield from self.prefix
+        yield from self._turns
+
+    def turns(self):
+        """The session's own turns still in memory, oldest first"""
+        return list(self._turns)
+
+    def append(self, message):
+        """Add a turn (a Message or a {"role", "content"} dict), spilling the oldest past max_turns"""
+        if not isinstance(message, Message):
+            message = Message(message["role"], message["content"])
+        self._turns.append(message)
+        if message.role == "user":
+            self.user_turns += 1
+
+        if len(self._turns) > self.max_turns:
+            # Spill a whole user/assistant pair at a time so the history stays paired
+            count = min(len(self._turns) - 1, max(2, len(self._turns) - self.max_turns))
+            spilled, self._turns = self._turns[:count], self._turns[count:]
+            self.spilled += count
+            if self.spill is not None:
+                self.spill(spilled)
+
+    def reset(self):
+        """Start a fresh conversation over the same shared prefix"""
+        return ConversationStore(self.prefix, self.max_turns, self.spill)
+
+
+def _restore_store(prefix, max_turns, state):
+    store = ConversationStore(prefix, max_turns)
+    store.spilled, store.user_turns, store._turns = state
+    return store
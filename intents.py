@@ -0,0 +1,146 @@
+import difflib
+import threading
+
+from response_cache import normalize_question
+from semantic_cache import content_words, numbers_in
+
+# Whole messages that are only small talk, after normalization
+INTENT_PHRASES = {
+    "greeting": [
+        "hi", "hello", "hey", "hiya", "hi there", "hello there", "hey there", "good morning",
+        "good afternoon", "good evening", "salam", "salaam", "as salamu alaykum", "marhaba",
+        "hi dubai genie", "hello dubai genie", "hi genie", "hello genie",
+    ],
+    "thanks": [
+        "thanks", "thank you", "thank you so much", "thanks a lot", "thx", "ty", "cheers",
+        "great thanks", "ok thanks", "okay thanks", "shukran", "thanks genie", "thank you genie",
+    ],
+    "goodbye": [
+        "bye", "goodbye", "good bye", "see you", "see you later", "bye bye", "that s all",
+        "that is all", "nothing else", "no thanks",
+    ],
+    "help": [
+        "help", "help me", "what can you do", "what can i ask", "what can i ask you", "how does this work",
+        "commands", "menu", "options",
+    ],
+}
+
+DEFAULT_RESPONSES = {
+    "greeting": """👋 Hi! I'm Dubai Genie, your Dubai trip helper.
+
+• Ask about places to visit
+• Ask about costs and budgets
+• Ask about getting around
+• Ask about best times to visit
+
+What would you like to know first?""",
+    "thanks": """You're welcome! 😊 Happy to help with your Dubai trip.
+
+Is there anything else you'd like to know about Dubai?""",
+    "goodbye": """Have a wonderful trip to Dubai! 🧞
+
+Come back anytime you need more tips.""",
+}
+
+
+class Route:
+    """A message answered locally: the intent it matched and the reply to show"""
+
+    __slots__ = ("intent", "response")
+
+    def __init__(self, intent, response):
+        self.intent = intent
+        self.response = response
+
+
+def canned_key(text):
+    """What must match for a canned answer to apply: the content words and the numbers of a question"""
+    return content_words(text), numbers_in(text)
+
+
+class IntentRouter:
+    """Routes small talk, help requests and rewordings of canned questions to local answers
+
+    Small talk matches by rules plus fuzzy string similarity on the
+    normalized message. A canned question only matches when the message
+    has the same content words and numbers, since a close string can
+    still ask something else ("top 10" vs "top 5", "Abu Dhabi" vs
+    "Dubai"). There are no network calls. route() returns None for real
+    questions, which go on to the model. Routed and forwarded counts are
+    kept so the share of turns answered locally can be reported.
+    """
+
+    def __init__(self, responses=None, canned_answers=(), fuzzy_cutoff=0.85, max_small_talk_words=5):
+        self.responses = dict(DEFAULT_RESPONSES)
+        self.responses.update(responses or {})
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.max_small_talk_words = max_small_talk_words
+
+        self._phrases = {}
+        for intent, phrases in INTENT_PHRASES.items():
+            if intent in self.responses:
+                for phrase in phrases:
+                    self._phrases[normalize_question(phrase)] = intent
+
+        # Canned questions (like the quick prompts) with their ready answers
+        self._canned = {
+            normalize_question(question): answer
+            for question, answer in canned_answers
+            if answer
+        }
+        self._canned_keys = {}
+        for question, answer in self._canned.items():
+            words, numbers = canned_key(question)
+            if words:
+                self._canned_keys.setdefault((words, numbers), answer)
+
+        self._lock = threading.Lock()
+        self.routed = {}
+        self.forwarded = 0
+
+    def classify(self, message):
+        """Return (intent, response) for a message that can be answered locally, or None"""
+        text = normalize_question(message)
+        if not text:
+            return None
+
+        if text in self._phrases:
+            intent = self._phrases[text]
+            return intent, self.responses[intent]
+        if text in self._canned:
+            return "canned", self._canned[text]
+
+        # Fuzzy matching only for short small talk, so real questions that
+        # happen to start with "hi" or "thanks" still reach the model
+        if len(text.split()) <= self.max_small_talk_words:
+            close = difflib.get_close_matches(text, self._phrases.keys(), n=1, cutoff=self.fuzzy_cutoff)
+            if close:
+                intent = self._phrases[close[0]]
+                return intent, self.responses[intent]
+
+        answer = self._canned_keys.get(canned_key(text))
+        if answer is not None:
+            return "canned", answer
+        return None
+
+    def route(self, message):
+        """Return a Route for a message answered locally, or None to forward it to the model"""
+        match = self.classify(message)
+        with self._lock:
+            if match is None:
+                self.forwarded += 1
+                return None
+            intent, response = match
+            self.routed[intent] = self.routed.get(intent, 0) + 1
+        return Route(intent, response)
+
+    def stats(self):
+        """Return routed counts per intent, the forwarded count and the routed share of all messages"""
+        with self._lock:
+            routed = sum(self.routed.values())
+            total = routed + self.forwarded
+            return {
+                "routed": dict(self.routed),
+                "forwarded": self.forwarded,
+                "routed_ratio": routed / total if total else 0.0,
+            }
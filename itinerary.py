@@ -0,0 +1,370 @@
+import functools
+import math
+import re
+
+from knowledge import ATTRACTIONS
+
+# Travel assumptions, from the transport facts the system prompt quotes
+WALK_KM = 1.0           # closer than this (straight line), walk
+WALK_KMH = 4.5
+ROAD_FACTOR = 1.3       # roads are longer than the straight line
+METRO_KMH = 35
+METRO_OVERHEAD = 10     # minutes walking to, and waiting at, the stations
+TAXI_KMH = 40
+TAXI_OVERHEAD = 5       # minutes to find a taxi
+TAXI_FLAG_FALL = 12     # minimum fare, AED
+TAXI_PER_KM = 2.2
+
+
+def metro_fare(km):
+    """Metro fare in AED (8-14 AED per trip, by distance)"""
+    return 8 if km <= 10 else 14
+
+
+def to_minutes(clock):
+    """"09:30" -> minutes after midnight"""
+    hours, minutes = clock.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def to_clock(minutes):
+    """Minutes after midnight -> "9:30" """
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def distance_km(a, b):
+    """Great-circle distance between two (latitude, longitude) points"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h))
+
+
+class Leg:
+    """Getting from one place to the next: minutes, AED and how"""
+
+    __slots__ = ("minutes", "cost", "mode")
+
+    def __init__(self, minutes, cost, mode):
+        self.minutes = minutes
+        self.cost = cost
+        self.mode = mode
+
+
+def travel_leg(origin, destination):
+    """The one way this planner gets between two places: walk, metro, taxi or the tour's pickup"""
+    km = distance_km(origin["location"], destination["location"])
+    road_km = km * ROAD_FACTOR
+    if destination.get("pickup"):
+        return Leg(TAXI_OVERHEAD + round(road_km / TAXI_KMH * 60), 0, "pickup")
+    if km < WALK_KM:
+        return Leg(round(road_km / WALK_KMH * 60), 0, "walk")
+    if origin["metro"] and destination["metro"]:
+        return Leg(METRO_OVERHEAD + round(road_km / METRO_KMH * 60), metro_fare(road_km), "metro")
+    return Leg(TAXI_OVERHEAD + round(road_km / TAXI_KMH * 60), round(TAXI_FLAG_FALL + TAXI_PER_KM * road_km), "taxi")
+
+
+def start_points():
+    """Where a day can start: the middle of each area with attractions (its hotels), by area name"""
+    areas = {}
+    for attraction in ATTRACTIONS:
+        if not attraction.get("pickup"):
+            areas.setdefault(attraction["area"], []).append(attraction)
+    return {
+        area: {
+            "id": f"start:{area}",
+            "name": area,
+            "location": (sum(a["location"][0] for a in members) / len(members),
+                         sum(a["location"][1] for a in members) / len(members)),
+            "metro": any(a["metro"] for a in members),
+        }
+        for area, members in areas.items()
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def travel_matrix():
+    """Every start point and attraction, and the leg between each pair; built once per process
+
+    Returns (places, legs) where places lists the start points and then
+    the attractions, and legs[i][j] is the Leg from places[i] to places[j].
+    """
+    places = list(start_points().values()) + ATTRACTIONS
+    legs = [[travel_leg(origin, destination) for destination in places] for origin in places]
+    return places, legs
+
+
+def in_season(attraction, month):
+    """Whether a seasonal attraction is open in a month (1-12); always true without a month"""
+    season = attraction.get("season")
+    if season is None or month is None:
+        return True
+    first, last = season
+    return first <= month <= last if first <= last else month >= first or month <= last
+
+
+class Stop:
+    __slots__ = ("attraction", "start", "end", "leg")
+
+    def __init__(self, attraction, start, end, leg):
+        self.attraction = attraction
+        self.start = start
+        self.end = end
+        self.leg = leg
+
+
+class Plan:
+    """A day plan: where it starts, its stops in order, the leg back to the start and the total cost
+
+    The cost includes the leg back, and end is when the day is back at
+    the start.
+    """
+
+    __slots__ = ("start", "stops", "back", "end", "cost", "budget")
+
+    def __init__(self, start, stops, back, end, cost, budget=None):
+        self.start = start
+        self.stops = stops
+        self.back = back
+        self.end = end
+        self.cost = cost
+        self.budget = budget
+
+
+def return_leg(legs, position, origin, places):
+    """The leg from a stop back to where the day started
+
+    Tours with pickup end when they drop you back, which their duration
+    already includes.
+    """
+    if places[position].get("pickup"):
+        return Leg(0, 0, "pickup")
+    return legs[position][origin]
+
+
+def plan_day(budget=None, start="Downtown", start_time="09:00", end_time="22:00", month=None,
+             max_stops=5, include=()):
+    """Find the best day plan, or None if nothing fits
+
+    The best plan has the highest total attraction priority, then the
+    lowest cost, then the earliest finish. Every visit fits in its
+    opening hours, the day ends back at the start by end_time, tickets
+    (cheapest price) and travel, the leg back included, together stay
+    within budget AED, and the attractions in include are all visited.
+    The search is exhaustive with a priority bound over the precomputed
+    travel matrix, and ties resolve in a fixed order, so the same request
+    always gives the same plan.
+    """
+    places, legs = travel_matrix()
+    starts = start_points()
+    if start not in starts:
+        raise ValueError(f"Unknown start area {start!r}, expected one of {', '.join(starts)}")
+    origin = list(starts).index(start)
+    first_attraction = len(starts)
+    include = set(include)
+    day_end = to_minutes(end_time)
+
+    # Required attractions are tried first so a plan with all of them is found early
+    candidates = sorted(
+        (index for index in range(first_attraction, len(places))
+         if in_season(places[index], month) and (budget is None or places[index]["cost"][0] <= budget)),
+        key=lambda index: (places[index]["id"] not in include, -places[index]["priority"], places[index]["id"]),
+    )
+    if not include <= {places[index]["id"] for index in candidates}:
+        # A required attraction is out of season or over budget on its own
+        return None
+    hours = {index: tuple(map(to_minutes, places[index]["hours"])) for index in candidates}
+    best = None
+    # (last stop, stops visited) -> (finish, cost) of the routes searched so far
+    seen = {}
+
+    def search(position, time, cost, score, path, remaining):
+        nonlocal best
+        # Another order of the same stops, ending at the same one, was no later and no dearer
+        state = (position, frozenset(stop.attraction for stop in path))
+        if any(done <= time and spent <= cost for done, spent in seen.get(state, ())):
+            return
+        seen.setdefault(state, []).append((time, cost))
+
+        visited = {places[stop.attraction]["id"] for stop in path}
+        if path and include <= visited:
+            back = return_leg(legs, position, origin, places)
+            end, total = time + back.minutes, cost + back.cost
+            key = (score, -total, -end)
+            if end <= day_end and (budget is None or total <= budget) and (best is None or key > best[0]):
+                best = (key, list(path), back, end, total)
+        if len(path) == max_stops or (path and places[path[-1].attraction].get("pickup")):
+            return
+        # Give up when a required attraction no longer fits, or when even the
+        # best remaining attractions (the required ones among them) can't beat
+        # the best plan so far
+        slots = max_stops - len(path)
+        required = [index for index in remaining if places[index]["id"] in include]
+        if len(required) > slots or any(
+                max(time + legs[position][index].minutes, hours[index][0]) + places[index]["duration"]
+                > min(hours[index][1], day_end) for index in required):
+            return
+        others = sorted((places[index]["priority"] for index in remaining if index not in required), reverse=True)
+        bound = score + sum(places[index]["priority"] for index in required) + sum(others[:slots - len(required)])
+        if best is not None and bound < best[0][0]:
+            return
+
+        for index in remaining:
+            attraction = places[index]
+            leg = legs[position][index]
+            opens, closes = hours[index]
+            # Visits start on the next 5 minutes, which is how people plan
+            visit_start = max(-(-(time + leg.minutes) // 5) * 5, opens)
+            visit_end = visit_start + attraction["duration"]
+            total = cost + leg.cost + attraction["cost"][0]
+            if visit_end > min(closes, day_end) or (budget is not None and total > budget):
+                continue
+            path.append(Stop(index, visit_start, visit_end, leg))
+            search(index, visit_end, total, score + attraction["priority"], path,
+                   [other for other in remaining if other != index])
+            path.pop()
+
+    search(origin, to_minutes(start_time), 0, 0, [], candidates)
+    if best is None:
+        return None
+    _, path, back, end, cost = best
+    stops = [Stop(places[stop.attraction], stop.start, stop.end, stop.leg) for stop in path]
+    return Plan(start, stops, back, end, cost, budget)
+
+
+# Short names people use for the start areas and attractions
+AREA_ALIASES = {
+    "downtown": "Downtown", "burj": "Downtown", "marina": "Dubai Marina", "jbr": "Dubai Marina",
+    "palm": "Palm Jumeirah", "deira": "Deira & Bur Dubai", "bur dubai": "Deira & Bur Dubai",
+    "old dubai": "Deira & Bur Dubai", "creek": "Deira & Bur Dubai", "zabeel": "Zabeel", "dubailand": "Dubailand",
+}
+ATTRACTION_ALIASES = {
+    "burj": "burj_khalifa", "fountain": "dubai_fountain", "palm": "palm_jumeirah", "jbr": "jbr_beach",
+    "souk": "old_dubai", "abra": "abra_ride", "fahidi": "al_fahidi", "frame": "dubai_frame",
+    "safari": "desert_safari", "desert": "desert_safari",
+}
+
+PLAN_PATTERN = re.compile(
+    r"\b(itinerary|day plan|plan (?:a |my |our |the |one |1 )?(?:full |whole )?day|(?:one|1|a) day (?:in|trip|plan)|day trip)\b"
+)
+MULTI_DAY_PATTERN = re.compile(r"\b(?:\d+|two|three|four|five|six|seven|several|few) days\b|\bweek\b")
+BUDGET_PATTERN = re.compile(r"\b(?:under|below|less than|max(?:imum)?|budget(?: of| is)?|up to)\s*(\d+)|\b(\d+)\s*(?:aed|dhs?|dirhams?)\b")
+START_TIME_PATTERN = re.compile(r"\b(?:start(?:ing)?|from|at|begin(?:ning)?)\s+(?:at\s+)?(\d{1,2})(?::(\d{2}))?\s*(am|pm)?\b")
+START_AREA_PATTERN = re.compile(r"\b(?:staying|stay|hotel|based|starting|start|from)\s+(?:is\s+)?(?:in|at|near|from)?\s*(?:the\s+)?([a-z]+(?: [a-z]+)?)")
+# Words a plan request may have besides the plan phrase, budget, start and places: a message with
+# any other word asks something else ("what should I pack?") or names a place the planner doesn't know
+PLAN_WORDS = frozenset(
+    "a an the and also of to in at on for with from near around i we me us my our you please can could would "
+    "will d ll m s make create give suggest build show want need like plan planning itinerary day trip full "
+    "whole one dubai visit visiting see seeing include including do should what how spend good best nice cheap "
+    "budget aed dhs dirham dirhams staying stay hotel based starting start is today tomorrow".split()
+)
+
+
+class PlanRequest:
+    """What a chat message asks the planner for"""
+
+    __slots__ = ("budget", "start", "start_time", "include")
+
+    def __init__(self, budget=None, start="Downtown", start_time="09:00", include=()):
+        self.budget = budget
+        self.start = start
+        self.start_time = start_time
+        self.include = include
+
+
+def parse_plan_request(message):
+    """Read a one-day plan request out of a message, or return None if it isn't one"""
+    text = message.lower()
+    if not PLAN_PATTERN.search(text) or MULTI_DAY_PATTERN.search(text):
+        return None
+    request = PlanRequest()
+
+    match = BUDGET_PATTERN.search(text)
+    if match:
+        request.budget = int(match.group(1) or match.group(2))
+
+    match = START_TIME_PATTERN.search(text)
+    if match:
+        hour, minute, half = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+        if half == "pm" and hour < 12:
+            hour += 12
+        elif half == "am" and hour == 12:
+            hour = 0
+        if not (5 <= hour <= 20 and minute < 60 and (half or match.group(2) or hour >= 6)):
+            # Not a time a day can start at ("11:30 pm", "at 3"); a plan from 9:00 would answer another question
+            return None
+        request.start_time = f"{hour:02d}:{minute:02d}"
+
+    # Where the day starts isn't a place to visit. "starting at 2pm from the
+    # marina" has a "starting at" first, so look past phrases naming no area
+    for match in START_AREA_PATTERN.finditer(text):
+        area = next((area for alias, area in AREA_ALIASES.items() if re.search(rf"\b{alias}\b", match.group(1))), None)
+        if area is not None:
+            request.start = area
+            text = text[:match.start(1)] + text[match.end(1):]
+            break
+
+    include = [attraction["id"] for attraction in ATTRACTIONS if attraction["name"].lower() in text]
+    include += [attraction_id for alias, attraction_id in ATTRACTION_ALIASES.items() if re.search(rf"\b{alias}\b", text)]
+    request.include = tuple(dict.fromkeys(include))
+
+    # Only plan requests: nothing may be left once everything the planner understood is taken out
+    for pattern in (PLAN_PATTERN, BUDGET_PATTERN, START_TIME_PATTERN):
+        text = pattern.sub(" ", text)
+    places = [attraction["name"].lower() for attraction in ATTRACTIONS] + list(ATTRACTION_ALIASES) + list(AREA_ALIASES)
+    for place in sorted(places, key=len, reverse=True):
+        text = re.sub(rf"\b{re.escape(place)}\b", " ", text)
+    if set(re.findall(r"[a-z0-9]+", text)) - PLAN_WORDS:
+        return None
+    return request
+
+
+def describe_stop(stop):
+    """One bullet of a plan: time, place, how long, tickets and how to get there"""
+    minutes = stop.attraction["duration"]
+    length = f"{minutes} min" if minutes < 60 else f"{minutes / 60:g} hour{'s' if minutes > 60 else ''}"
+    price = stop.attraction["cost"][0]
+    parts = [f"{price} AED" if price else "free"]
+    if stop.leg.mode == "walk":
+        parts.append("short walk")
+    elif stop.leg.mode == "pickup":
+        parts.append("hotel pickup")
+    else:
+        parts.append(f"{stop.leg.mode} {stop.leg.cost} AED")
+    return f"• {to_clock(stop.start)} {stop.attraction['name']} - {length} ({', '.join(parts)})"
+
+
+def format_plan(plan):
+    """Phrase a plan in the response format: one-line answer, bullets, tip and follow-up question"""
+    back = f"back by {to_clock(plan.end)}"
+    if plan.budget is not None:
+        answer = (f"Here is a day plan from {plan.start} for under {plan.budget} AED "
+                  f"(about {plan.cost} AED in total, {back}).")
+    else:
+        answer = f"Here is a day plan from {plan.start} for about {plan.cost} AED in total, {back}."
+
+    names = {stop.attraction["id"] for stop in plan.stops}
+    if "burj_khalifa" in names:
+        tip = "Tip: Buy Burj Khalifa tickets online to save money."
+    elif any(stop.leg.mode == "metro" for stop in plan.stops):
+        tip = "Tip: Get a Nol card for the metro and bus - it saves time and money."
+    else:
+        tip = "Tip: Carry water and a hat - the sun is strong in the day."
+
+    bullets = "\n".join(describe_stop(stop) for stop in plan.stops)
+    return f"{answer}\n\n{bullets}\n\n{tip}\n\nWould you like a different budget or start time?"
+
+
+def answer_plan_request(message, month=None, min_stops=3):
+    """The planner as a chat tool: a formatted day plan for a plan request, else None
+
+    None also when the message asks for more than a plan, names a place
+    the planner doesn't know, or no plan of at least min_stops stops fits
+    the request, so the model can answer it instead.
+    """
+    request = parse_plan_request(message)
+    if request is None:
+        return None
+    plan = plan_day(budget=request.budget, start=request.start, start_time=request.start_time,
+                    month=month, include=request.include)
+    return format_plan(plan) if plan is not None and len(plan.stops) >= min_stops else None
@@ -0,0 +1,314 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+# Attractions, with the costs the system prompt quotes (AED, adult prices). For
+# the day planner: opening hours, minutes a visit takes, map location, whether
+# a metro station is within walking distance and how much visitors rate it (1-5).
+# Safaris pick you up and drop you back at your hotel; seasonal places are open
+# between two months
+ATTRACTIONS = [
+    {"id": "burj_khalifa", "name": "Burj Khalifa", "area": "Downtown", "cost": (150, 400),
+     "summary": "World's tallest building with an observation deck on floors 124-125",
+     "keywords": "tallest building tower observation deck view at the top tickets",
+     "hours": ("08:30", "23:00"), "duration": 90, "location": (25.1972, 55.2744), "metro": True, "priority": 5},
+    {"id": "dubai_mall", "name": "Dubai Mall", "area": "Downtown", "cost": (0, 0),
+     "summary": "Huge shopping center with an aquarium, ice rink and the Dubai Fountain outside",
+     "keywords": "shopping mall aquarium ice rink shops",
+     "hours": ("10:00", "24:00"), "duration": 120, "location": (25.1985, 55.2796), "metro": True, "priority": 4},
+    {"id": "dubai_fountain", "name": "Dubai Fountain", "area": "Downtown", "cost": (0, 0),
+     "summary": "Free water and music show in front of Burj Khalifa every evening",
+     "keywords": "fountain show free music water evening",
+     "hours": ("18:00", "23:00"), "duration": 30, "location": (25.1960, 55.2760), "metro": True, "priority": 4},
+    {"id": "palm_jumeirah", "name": "Palm Jumeirah", "area": "Palm Jumeirah", "cost": (0, 0),
+     "summary": "Man-made island shaped like a palm tree with beaches and hotels",
+     "keywords": "palm island beach hotels atlantis monorail",
+     "hours": ("08:00", "24:00"), "duration": 120, "location": (25.1124, 55.1390), "metro": False, "priority": 4},
+    {"id": "dubai_marina", "name": "Dubai Marina", "area": "Dubai Marina", "cost": (0, 0),
+     "summary": "Waterfront area with a long walk, restaurants and boat rides",
+     "keywords": "marina waterfront walk restaurants boats yacht",
+     "hours": ("00:00", "24:00"), "duration": 90, "location": (25.0805, 55.1403), "metro": True, "priority": 4},
+    {"id": "jbr_beach", "name": "JBR Beach", "area": "Dubai Marina", "cost": (0, 0),
+     "summary": "Free public beach next to Dubai Marina with cafes along The Walk",
+     "keywords": "beach jbr jumeirah beach residence swim sea free",
+     "hours": ("06:00", "22:00"), "duration": 120, "location": (25.0780, 55.1330), "metro": True, "priority": 3},
+    {"id": "old_dubai", "name": "Old Dubai", "area": "Deira & Bur Dubai", "cost": (0, 0),
+     "summary": "Historic area with the gold and spice markets (souks) along Dubai Creek",
+     "keywords": "old historic souk souks gold spice market creek deira",
+     "hours": ("10:00", "22:00"), "duration": 90, "location": (25.2697, 55.2972), "metro": True, "priority": 4},
+    {"id": "abra_ride", "name": "Abra ride across Dubai Creek", "area": "Deira & Bur Dubai", "cost": (1, 1),
+     "summary": "Traditional wooden boat across the creek for about 1 AED",
+     "keywords": "abra boat creek cheap traditional ride",
+     "hours": ("05:00", "24:00"), "duration": 20, "location": (25.2644, 55.2967), "metro": True, "priority": 3},
+    {"id": "al_fahidi", "name": "Al Fahidi Historical District", "area": "Deira & Bur Dubai", "cost": (0, 0),
+     "summary": "Old wind-tower houses, small museums and art galleries",
+     "keywords": "al fahidi bastakiya heritage museum wind towers history",
+     "hours": ("08:00", "20:00"), "duration": 60, "location": (25.2635, 55.2997), "metro": True, "priority": 3},
+    {"id": "dubai_frame", "name": "Dubai Frame", "area": "Zabeel", "cost": (50, 50),
+     "summary": "Giant picture frame with views of old and new Dubai",
+     "keywords": "frame view zabeel",
+     "hours": ("09:00", "21:00"), "duration": 60, "location": (25.2356, 55.3003), "metro": True, "priority": 3},
+    {"id": "desert_safari", "name": "Desert Safari", "area": "Desert", "cost": (150, 400),
+     "summary": "Dune drive, camel ride and dinner show in the desert",
+     "keywords": "desert safari dunes camel sand dinner bbq",
+     "hours": ("15:00", "21:30"), "duration": 360, "location": (24.9800, 55.5500), "metro": False, "priority": 4,
+     "pickup": True},
+    {"id": "global_village", "name": "Global Village", "area": "Dubailand", "cost": (25, 30),
+     "summary": "Seasonal park with food and shops from around the world (October to April)",
+     "keywords": "global village seasonal food countries pavilions",
+     "hours": ("16:00", "24:00"), "duration": 180, "location": (25.0700, 55.3050), "metro": False, "priority": 3,
+     "season": (10, 4)},
+]
+
+# Topic answers written in the response format the system prompt asks for
+TOPICS = [
+    {
+        "id": "top_attractions",
+        "title": "Top attractions in Dubai",
+        "keywords": "top best must see attractions places visit popular sights things to do",
+        "answer": """Dubai has 5 must-see attractions that most visitors love.
+
+• Burj Khalifa - World's tallest building (tickets: 150-400 AED)
+• Dubai Mall - Huge shopping center with aquarium and fountain
+• Palm Jumeirah - Man-made island with beaches and hotels
+• Dubai Marina - Waterfront area with restaurants
+• Old Dubai - Historic area with gold and spice markets
+
+Tip: Buy Burj Khalifa tickets online to save money.
+
+Which of these places interests you most?""",
+    },
+    {
+        "id": "getting_around",
+        "title": "Getting around Dubai",
+        "keywords": "get around getting transport transportation metro taxi bus uber cheapest way travel nol card",
+        "answer": """Dubai has 4 main ways to get around the city.
+
+• Metro - Cheapest option (8-14 AED per trip)
+• Taxi - Most convenient but costs more
+• Bus - Covers areas the metro doesn't
+• Uber - Available but more expensive than taxis
+
+Tip: Get a Nol card for the metro and bus - it saves time and money.
+
+Will you be staying near a metro station?""",
+    },
+    {
+        "id": "best_time",
+        "title": "Best time to visit Dubai",
+        "keywords": "best time visit when season weather month months winter summer hot temperature",
+        "answer": """The best time to visit Dubai is from November to March.
+
+• November to March - Warm and sunny, great for the outdoors
+• April and October - Hot, but still okay in the mornings and evenings
+• June to September - Very hot, often above 40°C
+• Winter is busy, so hotels cost more
+
+Tip: Book hotels early if you visit in December or January.
+
+Which month are you thinking of?""",
+    },
+    {
+        "id": "budget_activities",
+        "title": "Things to do for under 100 AED",
+        "keywords": "cheap budget free under 100 aed low cost affordable save money",
+        "answer": """You can enjoy lots of Dubai for under 100 AED.
+
+• Dubai Fountain - Free water show every evening
+• JBR Beach - Free public beach with a nice walk
+• Abra ride - Cross Dubai Creek for about 1 AED
+• Gold and spice souks - Free to walk around
+• Dubai Frame - About 50 AED for great city views
+
+Tip: Use the metro to keep travel costs low.
+
+Do you prefer beaches or markets?""",
+    },
+    {
+        "id": "local_customs",
+        "title": "Local customs and etiquette",
+        "keywords": "local customs culture etiquette rules respect dress code important manners ramadan",
+        "answer": """Dubai is friendly, but a few local customs are important.
+
+• Dress modestly in malls, markets and mosques (cover shoulders and knees)
+• Avoid kissing or hugging in public
+• During Ramadan, don't eat or drink in public in the daytime
+
+Tip: Carry a light scarf or shawl - it helps with dress rules and cool malls.
+
+Will you be visiting during Ramadan?""",
+    },
+    {
+        "id": "safety",
+        "title": "Safety in Dubai",
+        "keywords": "safe safety danger crime night women solo secure",
+        "answer": """Dubai is one of the safest cities in the world.
+
+• Crime is very low, even at night
+• Police are helpful and easy to find
+• Taxis are metered and safe to use
+• The biggest risk is the heat - drink lots of water
+
+Tip: Wear sunscreen and a hat when you are outside in the day.
+
+Are you traveling alone or with others?""",
+    },
+]
+
+
+STOPWORDS = frozenset(
+    "a an and are as at be can do does for from how i in is it me my of on or the to what whats where which "
+    "who why will with you your dubai there should would could get about any some tell please".split()
+)
+
+
+# Kinds of places and services no topic covers; a question about them isn't answered by a topic
+OTHER_ENTITIES = frozenset(
+    "hotel hostel resort apartment villa restaurant cafe bar brunch flight airline airport visa".split()
+)
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords or single digits, with a light plural strip"""
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        # Single digits ("top 5", "3 customs") say nothing about the topic
+        if word in STOPWORDS or (word.isdigit() and len(word) == 1):
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def build_documents():
+    """Turn the attraction facts and topic answers into searchable documents"""
+    documents = []
+    for topic in TOPICS:
+        documents.append({
+            "id": topic["id"],
+            "title": topic["title"],
+            "text": topic["answer"],
+            "search_text": f"{topic['title']} {topic['keywords']}",
+            "answer": topic["answer"],
+        })
+    for attraction in ATTRACTIONS:
+        low, high = attraction["cost"]
+        if high == 0:
+            cost = "free to visit"
+        elif low == high:
+            cost = f"about {low} AED"
+        else:
+            cost = f"{low}-{high} AED"
+        text = f"{attraction['name']} ({attraction['area']}) - {attraction['summary']}; {cost}"
+        documents.append({
+            "id": attraction["id"],
+            "title": attraction["name"],
+            "text": text,
+            "search_text": f"{attraction['name']} {attraction['area']} {attraction['summary']} {attraction['keywords']}",
+            "answer": None,
+        })
+    return documents
+
+
+class KnowledgeIndex:
+    """In-memory BM25 index over the local Dubai knowledge base
+
+    The inverted index is built once; a lookup only touches the postings
+    of the query's own terms, so it takes microseconds.
+    """
+
+    def __init__(self, documents, k1=1.2, b=0.75):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(list)
+        self._lengths = []
+        self._terms = []
+        self._positions = {document["id"]: doc_id for doc_id, document in enumerate(documents)}
+
+        for doc_id, document in enumerate(documents):
+            tokens = tokenize(document["search_text"])
+            self._lengths.append(len(tokens))
+            self._terms.append(set(tokens))
+            for term, count in Counter(tokens).items():
+                self._postings[term].append((doc_id, count))
+
+        self._avg_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0
+        total = len(documents)
+        self._idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    def search(self, query, limit=3):
+        """Return up to `limit` (score, coverage, document) matches, best first
+
+        coverage is the share of the query's terms the document contains.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        scores = defaultdict(float)
+        for term in set(terms):
+            for doc_id, count in self._postings.get(term, ()):
+                norm = count + self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / self._avg_length)
+                scores[doc_id] += self._idf[term] * count * (self.k1 + 1) / norm
+
+        query_terms = set(terms)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [
+            (score, len(query_terms & self._terms[doc_id]) / len(query_terms), self.documents[doc_id])
+            for doc_id, score in ranked
+        ]
+
+    def answer(self, question, min_score=2.0, min_coverage=0.75):
+        """Return a canned answer when the question clearly asks for one of the topics, else None
+
+        None too when the question names something the topic doesn't
+        cover: an attraction or another topic's subject ("best time to
+        visit the Dubai Frame") or a kind of place no topic is about
+        ("hotels under 100 AED").
+        """
+        matches = self.search(question, limit=2)
+        if not matches:
+            return None
+        score, coverage, document = matches[0]
+        if document["answer"] is None or score < min_score or coverage < min_coverage:
+            return None
+        # Don't guess between two equally good topics
+        if len(matches) > 1 and matches[1][0] > 0.8 * score:
+            return None
+        covered = self._terms[self._positions[document["id"]]]
+        for term in set(tokenize(question)) - covered:
+            # One-letter leftovers ("what s") name nothing
+            if len(term) > 1 and (term in self._postings or term in OTHER_ENTITIES):
+                return None
+        return document["answer"]
+
+    def snippets(self, question, limit=3, min_score=1.0):
+        """Return the facts most relevant to a question, for adding to the prompt"""
+        return [
+            document["text"] if document["answer"] is None else f"{document['title']}: {bullet_points(document['text'])}"
+            for score, _, document in self.search(question, limit)
+            if score >= min_score
+        ]
+
+
+def bullet_points(text):
+    """Join the bullet lines of an answer into one line"""
+    return "; ".join(line.lstrip("• ").strip() for line in text.splitlines() if line.startswith("•"))
+
+
+def build_index():
+    """Build the knowledge index over the built-in facts"""
+    return KnowledgeIndex(build_documents())
+
+
+def with_snippets(question, snippets):
+    """Attach relevant local facts to a question before it is sent to the model"""
+    if not snippets:
+        return question
+    facts = "\n".join(f"- {snippet}" for snippet in snippets)
+    return f"{question}\n\n[Relevant Dubai facts - use them if they help:\n{facts}]"
@@ -0,0 +1,376 @@
+import functools
+import importlib.util
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from context_window import estimate_tokens, first_sentence
+
+# The Gemini SDK takes a long time to import, so it is only loaded on first use
+genai = None
+google_exceptions = None
+sdk_import_seconds = None
+_sdk_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def gemini_sdk_installed():
+    """Check for the Gemini SDK without importing it"""
+    try:
+        return importlib.util.find_spec("google.generativeai") is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def load_gemini_sdk():
+    """Import the Gemini SDK once, returning the genai module (None when it isn't installed)"""
+    global genai, google_exceptions, sdk_import_seconds
+    with _sdk_lock:
+        if genai is None and sdk_import_seconds is None:
+            start = time.perf_counter()
+            try:
+                import google.generativeai as sdk
+                from google.api_core import exceptions as sdk_exceptions
+            except ImportError:  # Only the stub backend is available without the Gemini SDK
+                sdk = sdk_exceptions = None
+            genai, google_exceptions = sdk, sdk_exceptions
+            sdk_import_seconds = time.perf_counter() - start
+        return genai
+
+
+class BackendError(Exception):
+    """Base class for errors raised by a model backend"""
+
+    # Whether trying the same request again later may succeed
+    retryable = False
+
+
+class BackendNotConfiguredError(BackendError):
+    """The backend is missing its API key or SDK"""
+
+
+class QuotaExceededError(BackendError):
+    """The API quota or rate limit was exceeded"""
+
+    retryable = True
+
+
+class InvalidAPIKeyError(BackendError):
+    """The API key was rejected"""
+
+
+class ModelNotFoundError(BackendError):
+    """The requested model is not available"""
+
+
+class TransientBackendError(BackendError):
+    """A timeout, dropped connection or server-side error"""
+
+    retryable = True
+
+
+class DeadlineExceededError(BackendError):
+    """The request did not finish before its deadline"""
+
+
+class RequestCancelledError(BackendError):
+    """Nobody was waiting for the reply any more, so it was stopped"""
+
+
+class Reply:
+    """A finished model reply with its token usage"""
+
+    def __init__(self, text="", usage=None):
+        self.text = text
+        self.usage = usage or {}
+
+
+class StreamingReply(Reply):
+    """A model reply that fills in its text and usage as it is iterated"""
+
+    def __init__(self, produce):
+        super().__init__()
+        self._produce = produce
+
+    def __iter__(self):
+        parts = []
+        for chunk in self._produce(self):
+            parts.append(chunk)
+            self.text = "".join(parts)
+            yield chunk
+
+
+class LLMBackend:
+    """Interface shared by the model backends
+
+    History is a list of OpenAI-style messages ({"role": "user" or
+    "assistant", "content": ...}); backends convert it to their own format.
+    Failures are raised as BackendError subclasses.
+    """
+
+    name = "base"
+    model_name = ""
+
+    @property
+    def configured(self):
+        return True
+
+    def stream(self, history, message, timeout=None):
+        """Start generating a reply, returning a StreamingReply that yields text chunks
+
+        timeout bounds the wait for the backend's response in seconds.
+        """
+        return StreamingReply(lambda reply: self._stream(history, message, reply, timeout))
+
+    def generate(self, history, message, timeout=None):
+        """Generate a complete reply"""
+        reply = self.stream(history, message, timeout)
+        for _ in reply:
+            pass
+        return reply
+
+    def count_tokens(self, text):
+        return estimate_tokens(text)
+
+    def warm_up(self):
+        """Do any slow one-time setup ahead of the first request"""
+
+    def _stream(self, history, message, reply, timeout=None):
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini backend, sending the system prompt as a system instruction
+
+    Creating the backend is cheap: the SDK is imported and the client
+    configured on the first request, or earlier by warm_up().
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key, model_name, generation_config, system_instruction,
+                 cache_system_prompt=False, cache_ttl=timedelta(hours=1)):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.system_instruction = system_instruction
+        self.cache_system_prompt = cache_system_prompt
+        self.cache_ttl = cache_ttl
+        self._model = None
+        self._model_expires_at = None
+        self._lock = threading.Lock()
+        self._client_ready = False
+
+    @property
+    def configured(self):
+        return bool(self.api_key) and (genai is not None or gemini_sdk_installed())
+
+    def warm_up(self):
+        if self.configured:
+            self._get_model()
+
+    def _get_model(self):
+        """Create the Gemini model once, refreshing it before a cached system prompt expires"""
+        with self._lock:
+            if self._model is not None and (self._model_expires_at is None or datetime.now() < self._model_expires_at):
+                return self._model
+
+            if not self._client_ready:
+                if load_gemini_sdk() is None:
+                    raise BackendNotConfiguredError("The google-generativeai package is not installed")
+                genai.configure(api_key=self.api_key)
+                self._client_ready = True
+
+            self._model, self._model_expires_at = None, None
+            # Optionally reuse the system prompt as a cached context prefix so it isn't
+            # re-tokenized for every conversation (Gemini only caches prompts above a minimum size)
+            if self.cache_system_prompt:
+                try:
+                    from google.generativeai import caching
+                    cached_prompt = caching.CachedContent.create(
+                        model=f"models/{self.model_name}",
+                        display_name="dubai-genie-system-prompt",
+                        system_instruction=self.system_instruction,
+                        ttl=self.cache_ttl
+                    )
+                    self._model = genai.GenerativeModel.from_cached_content(
+                        cached_content=cached_prompt,
+                        generation_config=self.generation_config
+                    )
+                    self._model_expires_at = datetime.now() + self.cache_ttl - timedelta(minutes=5)
+                except Exception:
+                    # Fall back to sending the system instruction with each request
+                    pass
+
+            if self._model is None:
+                self._model = genai.GenerativeModel(
+                    model_name=self.model_name,
+                    generation_config=self.generation_config,
+                    system_instruction=self.system_instruction
+                )
+            return self._model
+
+    def _stream(self, history, message, reply, timeout=None):
+        if not self.configured:
+            raise BackendNotConfiguredError("Google API key not set")
+
+        contents = to_gemini_contents(history)
+        contents.append({"role": "user", "parts": [message]})
+        request_options = {"timeout": timeout} if timeout else None
+        try:
+            response = self._get_model().generate_content(contents, stream=True, request_options=request_options)
+            for chunk in response:
+                # The closing chunk can carry no text parts at all
+                if chunk.parts:
+                    yield chunk.text
+        except BackendError:
+            raise
+        except Exception as e:
+            raise classify_gemini_error(e) from e
+
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            reply.usage = {
+                "prompt_tokens": usage.prompt_token_count,
+                "response_tokens": usage.candidates_token_count,
+                # Tokens read from the cached prefix instead of being re-tokenized this turn
+                "prompt_tokens_saved": getattr(usage, "cached_content_token_count", 0) or 0,
+            }
+
+    def count_tokens(self, text):
+        try:
+            return self._get_model().count_tokens(text).total_tokens
+        except Exception:
+            return estimate_tokens(text)
+
+
+def to_gemini_contents(history):
+    """Convert OpenAI-style messages to Gemini contents, skipping system messages"""
+    contents = []
+    for msg in history:
+        if msg["role"] == "user":
+            contents.append({"role": "user", "parts": [msg["content"]]})
+        elif msg["role"] == "assistant":
+            contents.append({"role": "model", "parts": [msg["content"]]})
+    return contents
+
+
+def classify_gemini_error(error):
+    """Map a Gemini SDK exception onto the backend error taxonomy"""
+    message = str(error)
+    lowered = message.lower()
+
+    if google_exceptions is not None:
+        if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+            return QuotaExceededError(message)
+        if isinstance(error, google_exceptions.NotFound):
+            return ModelNotFoundError(message)
+        if isinstance(error, (google_exceptions.Unauthenticated, google_exceptions.PermissionDenied)):
+            return InvalidAPIKeyError(message)
+        if isinstance(error, (google_exceptions.DeadlineExceeded, google_exceptions.ServiceUnavailable,
+                              google_exceptions.InternalServerError)):
+            return TransientBackendError(message)
+
+    # Some errors only say what went wrong in their text
+    if "quota" in lowered:
+        return QuotaExceededError(message)
+    if "invalid" in lowered and "key" in lowered:
+        return InvalidAPIKeyError(message)
+    if "model" in lowered and "not found" in lowered:
+        return ModelNotFoundError(message)
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return TransientBackendError(message)
+    return BackendError(message)
+
+
+class StubBackend(LLMBackend):
+    """Offline, deterministic backend for load tests, benchmarks and CI
+
+    Replies are built from the question alone and streamed word by word.
+    latency is the delay before the first chunk, tokens_per_second the
+    streaming rate (0 streams instantly) and quota_error_rate the share
+    of requests that fail with QuotaExceededError, drawn from a seeded
+    random generator so runs are reproducible.
+    """
+
+    name = "stub"
+    model_name = "stub"
+
+    def __init__(self, latency=0.0, tokens_per_second=0.0, quota_error_rate=0.0, seed=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.quota_error_rate = quota_error_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def reply_text(self, history, message):
+        """Build the deterministic reply for a question"""
+        topic = first_sentence(message, max_words=12).rstrip("?.! ")
+        return (
+            f"Here is a simple answer about: {topic}.\n\n"
+            "• Burj Khalifa - World's tallest building (tickets: 150-400 AED)\n"
+            "• Dubai Mall - Huge shopping center with aquarium and fountain\n"
+            "• Metro - Cheapest way to get around (8-14 AED per trip)\n\n"
+            "Tip: Visit outdoor places in the morning or evening.\n\n"
+            f"This is reply number {len(history) // 2 + 1} in our chat. What else would you like to know?"
+        )
+
+    def _stream(self, history, message, reply, timeout=None):
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.quota_error_rate
+
+        if self.latency:
+            if timeout is not None and self.latency > timeout:
+                time.sleep(timeout)
+                raise DeadlineExceededError("Stub backend: no response before the timeout (simulated)")
+            time.sleep(self.latency)
+        if fail:
+            raise QuotaExceededError("Stub backend: quota exceeded (simulated)")
+
+        text = self.reply_text(history, message)
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            chunk = word if i == len(words) - 1 else word + " "
+            if self.tokens_per_second:
+                time.sleep(self.count_tokens(chunk) / self.tokens_per_second)
+            yield chunk
+
+        prompt_tokens = sum(self.count_tokens(msg["content"]) for msg in history) + self.count_tokens(message)
+        reply.usage = {
+            "prompt_tokens": prompt_tokens,
+            "response_tokens": self.count_tokens(text),
+            "prompt_tokens_saved": 0,
+        }
+
+
+def create_backend(name, **settings):
+    """Create a model backend by name ("gemini" or "stub")"""
+    if name == "gemini":
+        return GeminiBackend(**settings)
+    if name == "stub":
+        return StubBackend(**settings)
+    raise ValueError(f"Unknown model backend: {name}")
+
+
+def create_backend_from_env(model_name, generation_config, system_instruction):
+    """Create the backend the DG_* environment settings ask for (DG_BACKEND=stub runs offline)"""
+    if os.getenv("DG_BACKEND", "gemini") == "stub":
+        return create_backend(
+            "stub",
+            latency=float(os.getenv("DG_STUB_LATENCY", "0.5")),
+            tokens_per_second=float(os.getenv("DG_STUB_TOKENS_PER_SEC", "50")),
+            quota_error_rate=float(os.getenv("DG_STUB_ERROR_RATE", "0")),
+            seed=int(os.getenv("DG_STUB_SEED", "0"))
+        )
+    return create_backend(
+        "gemini",
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        model_name=model_name,
+        generation_config=generation_config,
+        system_instruction=system_instruction,
+        cache_system_prompt=os.getenv("DG_CACHE_SYSTEM_PROMPT", "").lower() in ("1", "true", "yes")
+    )
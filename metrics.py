@@ -0,0 +1,196 @@
+import json
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+# Latency buckets in seconds, from a cached reply up to a slow generation
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Per-turn timings recorded as histograms
+TURN_TIMINGS = ("prepare", "queue_wait", "ttft", "generation", "render", "history_render", "total")
+
+
+def process_uptime():
+    """Seconds since this process started, or None where /proc isn't available"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 (starttime) counted after the parenthesized command name
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            system_uptime = float(f.read().split()[0])
+        return system_uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in sorted(labels.items())) + "}"
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            if key not in self._histograms:
+                self._histograms[key] = Histogram()
+            self._histograms[key].observe(value)
+
+    def gauge(self, name, read, help_text=""):
+        """Register a gauge whose value is read by calling `read` at scrape time"""
+        with self._lock:
+            self._help[name] = help_text
+            self._gauges[name] = read
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            gauges = sorted(self._gauges.items())
+            help_texts = dict(self._help)
+
+            described = set()
+            for (name, labels), value in counters:
+                if name not in described:
+                    lines.append(f"# HELP {name} {help_texts.get(name, '')}")
+                    lines.append(f"# TYPE {name} counter")
+                    described.add(name)
+                lines.append(f"{name}{format_labels(dict(labels))} {value}")
+
+            for (name, labels), histogram in histograms:
+                if name not in described:
+                    lines.append(f"# HELP {name} {help_texts.get(name, '')}")
+                    lines.append(f"# TYPE {name} histogram")
+                    described.add(name)
+                labels = dict(labels)
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f"{name}_bucket{format_labels({**labels, 'le': bound})} {count}")
+                lines.append(f"{name}_bucket{format_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+        for name, read in gauges:
+            try:
+                value = read()
+            except Exception:
+                continue
+            lines.append(f"# HELP {name} {help_texts.get(name, '')}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class TurnRecorder:
+    """Records one structured entry per chat turn to a rotating JSONL log and the metrics registry"""
+
+    def __init__(self, registry, log_path=None, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.registry = registry
+        self._logger = None
+        if log_path:
+            self._logger = logging.getLogger(f"dubai_genie.turns.{log_path}")
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+            if not self._logger.handlers:
+                handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                self._logger.addHandler(handler)
+
+    def record(self, turn):
+        """Record a finished turn: a dict of timings in seconds, token counts, cache hit and error class"""
+        turn.setdefault("ts", time.time())
+        source = turn.get("source", "chat")
+        outcome = "error" if turn.get("error") else "ok"
+
+        self.registry.inc("dg_turns_total", help_text="Chat turns handled", source=source, outcome=outcome)
+        if turn.get("intent"):
+            self.registry.inc("dg_routed_turns_total", help_text="Turns answered by the local intent router", intent=turn["intent"])
+        if turn.get("tool"):
+            self.registry.inc("dg_tool_calls_total", help_text="Turns answered by a local tool", tool=turn["tool"])
+        if turn.get("kb_hit"):
+            self.registry.inc("dg_kb_answers_total", help_text="Turns answered from the local knowledge base", source=source)
+        if turn.get("prefetch"):
+            self.registry.inc("dg_prefetch_hits_total", help_text="Turns served by a prefetched follow-up answer", state=turn["prefetch"])
+        if turn.get("cache_hit"):
+            self.registry.inc("dg_cache_hits_total", help_text="Turns answered without calling the model", source=source)
+        if turn.get("semantic_score") is not None:
+            self.registry.inc("dg_semantic_hits_total", help_text="Cache hits served for a similar, not identical, question", source=source)
+        if turn.get("error"):
+            self.registry.inc("dg_errors_total", help_text="Turns that ended in a model error", error=turn["error"])
+        for problem in turn.get("format_problems") or ():
+            self.registry.inc("dg_format_problems_total", help_text="Model replies that break the response format", problem=problem)
+        if turn.get("trimmed_lines"):
+            self.registry.inc("dg_trimmed_lines_total", turn["trimmed_lines"], help_text="Reply lines dropped to keep to the response format")
+        for field in ("prompt_tokens", "response_tokens", "prompt_tokens_saved"):
+            if turn.get(field):
+                self.registry.inc(f"dg_{field}_total", turn[field], help_text=f"Sum of {field.replace('_', ' ')} over all turns")
+        for timing in TURN_TIMINGS:
+            if turn.get(timing) is not None:
+                self.registry.observe(f"dg_turn_{timing}_seconds", turn[timing], help_text=f"Per-turn {timing.replace('_', ' ')} time")
+
+        if self._logger is not None:
+            self._logger.info(json.dumps(turn, default=str))
+
+
+def start_metrics_server(registry, port, host="127.0.0.1"):
+    """Serve the registry on http://host:port/metrics from a daemon thread"""
+    # Imported here so the app doesn't pay for http.server unless metrics are served
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes would otherwise flood the app's stderr
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="dg-metrics", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,216 @@
+import os
+import time
+
+from intents import IntentRouter
+from itinerary import answer_plan_request
+from knowledge import build_index, with_snippets
+from prompts import help_response, quick_prompts
+from response_cache import create_response_cache, make_cache_key
+from response_format import ReplyShaper, validate_reply
+from semantic_cache import MatchAuditLog, SimilarityIndex
+
+
+class AnswerPipeline:
+    """The steps every question goes through, shared by the chat UI and batch.py
+
+    In order: the intent router, the day planner, the knowledge base, the
+    response cache, the similarity index, and then the model through the
+    request scheduler, with the knowledge snippets for the question and
+    the reply held to the response format as it streams. Only opening
+    questions get knowledge-base topic answers or use the caches, since
+    their answers don't depend on earlier turns ("Is it safe?" after a
+    safari reply asks about the safari). Each step records what it did
+    in the caller's turn dict ("intent", "tool", "kb_hit", "cache_hit",
+    "semantic_score", ...), the fields the turn metrics read.
+    Streamlit-free and thread-safe.
+    """
+
+    def __init__(self, scheduler, cache, fingerprint, index, router=None, planner=True, kb_answers=True,
+                 kb_snippets=True, similar=None, audit_log=None, shape_replies=True, max_words=120, max_bullets=5):
+        self.scheduler = scheduler
+        self.cache = cache
+        self.fingerprint = fingerprint
+        self.index = index
+        self.router = router
+        self.planner = planner
+        self.kb_answers = kb_answers
+        self.kb_snippets = kb_snippets
+        self.similar = similar
+        self.audit_log = audit_log
+        self.shape_replies = shape_replies
+        self.max_words = max_words
+        self.max_bullets = max_bullets
+
+    def cache_key(self, question):
+        """The response cache key of an opening question"""
+        return make_cache_key(question, self.fingerprint)
+
+    def answer_locally(self, question, first_question, turn, record=True):
+        """Answer a question without the model when a local step can, else return None
+
+        With record=False nothing is counted, logged or dropped from the
+        similarity index, for asking ahead whether a question would be
+        answered locally.
+        """
+        turn.setdefault("cache_hit", False)
+
+        # Small talk, help and repeats of the quick prompts
+        if self.router is not None:
+            route = self.router.route(question) if record else self.router.classify(question)
+            if route is not None:
+                intent, response = (route.intent, route.response) if record else route
+                turn["intent"] = intent
+                return response
+
+        # Day plans are solved by the itinerary planner
+        plan = answer_plan_request(question, month=time.localtime().tm_mon) if self.planner else None
+        if plan is not None:
+            turn["tool"] = "itinerary"
+            return plan
+
+        if not first_question:
+            return None
+
+        # Clear-cut factual questions are answered straight from the knowledge base
+        answer = self.index.answer(question) if self.kb_answers else None
+        if answer is not None:
+            turn["kb_hit"] = True
+            return answer
+
+        cached = self.cache.get(self.cache_key(question))
+        if cached is not None:
+            turn["cache_hit"] = True
+            return cached
+
+        # Otherwise the answer to a close paraphrase will do
+        match = self.similar.search(question) if self.similar is not None else None
+        if match is None:
+            return None
+        cached = self.cache.get(match.key)
+        if cached is None:
+            # That answer has expired or been evicted since
+            if record:
+                self.similar.discard(match.key)
+            return None
+        turn["cache_hit"] = True
+        turn["semantic_score"] = match.score
+        turn["similar_to"] = match.question
+        if record and self.audit_log is not None:
+            self.audit_log.record(question, match, self.similar.threshold, session=turn.get("session"))
+        return cached
+
+    def answered_locally(self, question, first_question=False):
+        """Whether a question would be answered without the model; counts nothing"""
+        return self.answer_locally(question, first_question, {}, record=False) is not None
+
+    def model_message(self, question):
+        """The question as sent to the model: with the few local facts relevant to it"""
+        return with_snippets(question, self.index.snippets(question)) if self.kb_snippets else question
+
+    def new_shaper(self):
+        """A shaper that holds one model reply to the response format, or None when replies aren't shaped"""
+        return ReplyShaper(self.max_words, self.max_bullets) if self.shape_replies else None
+
+    def shape(self, text):
+        """Hold a complete model reply to the response format, like a streamed one"""
+        shaper = self.new_shaper()
+        return text if shaper is None else shaper.feed(text) + shaper.finish()
+
+    def remember(self, question, cache_key, text):
+        """Cache the answer to an opening question and index the question for its paraphrases"""
+        if cache_key is None or not text:
+            return
+        self.cache.set(cache_key, text)
+        if self.similar is not None:
+            self.similar.add(question, cache_key)
+
+    def stream_reply(self, history, question, first_question, turn, flight_key=None, heartbeat=None):
+        """Stream the model's shaped reply to a question, yielding text chunks as they arrive
+
+        With a heartbeat, an empty string is also yielded every heartbeat
+        seconds while the model is silent. Requests with the same flight
+        key (by default the cache key of an opening question) share one
+        upstream call. The reply is cached when the question opens the
+        conversation, unless it came from another question's flight (a
+        prefetch it was matched to): that answer belongs to the other
+        question, and stays in that question's prefetch entry. Its queue
+        wait, format problems and token usage go into turn. Backend errors
+        are raised.
+        """
+        cache_key = self.cache_key(question) if first_question else None
+        reply = self.scheduler.stream(history, self.model_message(question), key=flight_key or cache_key)
+        shaper = self.new_shaper()
+        parts = []
+        for chunk in reply.chunks(heartbeat=heartbeat):
+            if not chunk:
+                yield chunk
+                continue
+            if shaper is not None:
+                chunk = shaper.feed(chunk)
+            if chunk:
+                parts.append(chunk)
+                yield chunk
+            if shaper is not None and shaper.done:
+                # The follow-up question ends the reply; anything after it is never shown
+                break
+        if shaper is not None:
+            tail = shaper.finish()
+            if tail:
+                parts.append(tail)
+                yield tail
+            turn["trimmed_lines"] = shaper.dropped
+        text = "".join(parts)
+        turn["queue_wait"] = reply.wait_time
+        turn["format_problems"] = validate_reply(text)
+        if reply.usage:
+            turn["usage"] = reply.usage
+        if flight_key is None or flight_key == cache_key:
+            self.remember(question, cache_key, text)
+
+
+def create_pipeline_from_env(scheduler, fingerprint, local_answers=True):
+    """Build the answer pipeline the DG_* environment settings ask for
+
+    With local_answers=False every question goes to the model: no intent
+    router, day planner or knowledge base answers.
+    """
+    index = build_index()
+    kb_answers = local_answers and os.getenv("DG_KB_ANSWERS", "1") != "0"
+    router = None
+    if local_answers and os.getenv("DG_INTENT_ROUTER", "1") != "0":
+        # Repeats of the quick prompts reuse their knowledge-base answers
+        canned_answers = [(prompt["text"], index.answer(prompt["text"])) for prompt in quick_prompts] if kb_answers else []
+        router = IntentRouter(
+            responses={"help": help_response},
+            canned_answers=canned_answers,
+            fuzzy_cutoff=float(os.getenv("DG_INTENT_CUTOFF", "0.85"))
+        )
+    similar = None
+    if os.getenv("DG_SEMANTIC_CACHE", "1") != "0":
+        similar = SimilarityIndex(
+            threshold=float(os.getenv("DG_SEMANTIC_THRESHOLD", "0.8")),
+            max_size=int(os.getenv("DG_CACHE_SIZE", "256"))
+        )
+    # DG_SEMANTIC_AUDIT_LOG="" turns off the log of answers served for similar questions
+    audit_path = os.getenv("DG_SEMANTIC_AUDIT_LOG", "dubai_genie_semantic_matches.jsonl")
+    return AnswerPipeline(
+        scheduler,
+        # DG_CACHE_BACKEND=sqlite shares one on-disk cache between all workers on the node
+        create_response_cache(
+            backend=os.getenv("DG_CACHE_BACKEND", "memory"),
+            path=os.getenv("DG_CACHE_PATH", "dubai_genie_cache.sqlite3"),
+            max_size=int(os.getenv("DG_CACHE_SIZE", "256")),
+            ttl=int(os.getenv("DG_CACHE_TTL", str(6 * 60 * 60)))
+        ),
+        fingerprint,
+        index,
+        router=router,
+        planner=local_answers and os.getenv("DG_PLANNER", "1") != "0",
+        kb_answers=kb_answers,
+        kb_snippets=os.getenv("DG_KB_SNIPPETS", "1") != "0",
+        similar=similar,
+        audit_log=MatchAuditLog(audit_path) if similar is not None and audit_path else None,
+        shape_replies=os.getenv("DG_SHAPE_REPLIES", "1") != "0",
+        max_words=int(os.getenv("DG_REPLY_MAX_WORDS", "120")),
+        max_bullets=int(os.getenv("DG_REPLY_MAX_BULLETS", "5"))
+    )
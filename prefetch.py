@@ -0,0 +1,201 @@
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from response_cache import normalize_question
+from response_format import BULLET_PATTERN
+from scheduler import TokenBucket
+from semantic_cache import content_words, numbers_in, words_covered
+
+
+class FollowUp:
+    """A question the user is likely to ask next, and the short forms that count as asking it"""
+
+    __slots__ = ("question", "aliases", "keys")
+
+    def __init__(self, question, aliases=()):
+        self.question = question
+        self.aliases = tuple(dict.fromkeys(normalize_question(text) for text in (question, *aliases)))
+        # What a message must share with the question or an alias to ask it
+        self.keys = tuple((content_words(alias), numbers_in(alias)) for alias in self.aliases)
+
+
+def predict_follow_ups(reply, limit=3, max_subject_words=5):
+    """Guess the next questions from the bullets of a reply
+
+    Quoted bullets (the help guide's examples) are questions already,
+    "Ask about ..." bullets (the greeting) are topics, and other bullets
+    name a place or option the closing question asks the user to pick.
+    """
+    follow_ups = []
+    seen = set()
+    for line in reply.splitlines():
+        line = line.strip()
+        match = BULLET_PATTERN.match(line)
+        if not match:
+            continue
+        body = line[match.end():].strip()
+
+        if len(body) > 2 and body[0] == body[-1] == '"':
+            follow_up = FollowUp(body[1:-1])
+        elif body.lower().startswith("ask about "):
+            topic = body[len("ask about "):]
+            follow_up = FollowUp(f"Tell me about {topic} in Dubai", [topic])
+        else:
+            subject = re.split(r"\s+-\s+|\s*\(|:", body, maxsplit=1)[0].strip()
+            if not subject or len(subject.split()) > max_subject_words:
+                continue
+            follow_up = FollowUp(f"Tell me more about {subject}", [subject])
+
+        if follow_up.aliases[0] not in seen:
+            seen.add(follow_up.aliases[0])
+            follow_ups.append(follow_up)
+        if len(follow_ups) >= limit:
+            break
+    return follow_ups
+
+
+class PrefetchEntry:
+    __slots__ = ("follow_up", "key", "text")
+
+    def __init__(self, follow_up, key):
+        self.follow_up = follow_up
+        self.key = key
+        self.text = None
+
+
+class PrefetchCache:
+    """One session's prefetched answers for its next turn
+
+    Entries are added when a prefetch is scheduled (pending, with the
+    scheduler key of its request) and filled in when it finishes. A
+    message matches an entry when it has the same content words (allowing
+    for typos) and the same numbers as the question or one of its
+    aliases: "the Dubai Mall please" asks for "Tell me about Dubai Mall",
+    "Dubai Mall parking fees" doesn't.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+
+    def add(self, follow_up, key):
+        entry = PrefetchEntry(follow_up, key)
+        with self._lock:
+            self._entries.append(entry)
+        return entry
+
+    def discard(self, entry):
+        with self._lock:
+            if entry in self._entries:
+                self._entries.remove(entry)
+
+    def match(self, message):
+        """Return the entry a message asks for, or None"""
+        words, numbers = content_words(message), numbers_in(message)
+        if not words:
+            return None
+        with self._lock:
+            entries = list(self._entries)
+        for entry in entries:
+            for alias_words, alias_numbers in entry.follow_up.keys:
+                if (numbers == alias_numbers and words_covered(words, alias_words)
+                        and words_covered(alias_words, words)):
+                    return entry
+        return None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class Prefetcher:
+    """Generates likely next answers on a low-priority pool, within a budget
+
+    Prefetches run on their own small pool and are only sent while the
+    scheduler has no queue and less than max_busy of its workers in use,
+    and at most requests_per_minute of them (burst at once), so they never
+    take capacity or rate limit from real requests. A prefetch that can't
+    be sent is skipped, not queued behind them.
+    """
+
+    def __init__(self, scheduler, workers=1, requests_per_minute=10, burst=3, max_busy=0.5, max_pending=4, timeout=30.0):
+        self.scheduler = scheduler
+        self.max_busy = max_busy
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._budget = TokenBucket(requests_per_minute / 60.0, burst)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dg-prefetch")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._sending = 0
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "skipped_busy": 0, "skipped_budget": 0}
+
+    def _idle(self):
+        """Whether the scheduler has room to spare, not counting this pool's own requests"""
+        stats = self.scheduler.stats()
+        with self._lock:
+            sending = self._sending
+        waiting = max(0, stats["queue_depth"] - sending)
+        busy = stats["queue_depth"] + stats["in_flight"] - sending
+        return waiting == 0 and busy < self.scheduler.max_concurrent * self.max_busy
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def submit(self, cache, history, follow_up, message=None, finish=None):
+        """Prefetch the answer to a follow-up into a session's cache; returns whether it was scheduled
+
+        message is what is sent for it (the question with any added
+        context) and finish turns the raw reply into the text to cache.
+        """
+        if not self._idle():
+            self._count("skipped_busy")
+            return False
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._counters["skipped_busy"] += 1
+                return False
+        if not self._budget.try_acquire():
+            self._count("skipped_budget")
+            return False
+
+        entry = cache.add(follow_up, key=f"prefetch:{uuid.uuid4().hex}")
+        with self._lock:
+            self._pending += 1
+            self._counters["submitted"] += 1
+        self._pool.submit(self._fetch, cache, entry, list(history), message or follow_up.question, finish)
+        return True
+
+    def _fetch(self, cache, entry, history, message, finish):
+        try:
+            # Real requests may have arrived while this one waited for the pool
+            if not self._idle():
+                cache.discard(entry)
+                self._count("skipped_busy")
+                return
+            with self._lock:
+                self._sending += 1
+            try:
+                reply = self.scheduler.generate(history, message, key=entry.key, timeout=self.timeout)
+            finally:
+                with self._lock:
+                    self._sending -= 1
+            entry.text = finish(reply.text) if finish is not None else reply.text
+            self._count("completed")
+        except Exception:
+            cache.discard(entry)
+            self._count("failed")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self):
+        with self._lock:
+            return {"pending": self._pending, **self._counters}
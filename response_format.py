@@ -0,0 +1,176 @@
+import re
+
+# "• item", "- item", "* item" or "1. item"
+BULLET_PATTERN = re.compile(r"^(?:[•*-]|\d+[.)])\s+")
+TIP_PATTERN = re.compile(r"^\**tip\b", re.IGNORECASE)
+
+
+def line_kind(line):
+    """Classify a stripped reply line as "blank", "bullet", "tip" or "text" """
+    if not line:
+        return "blank"
+    if BULLET_PATTERN.match(line):
+        return "bullet"
+    if TIP_PATTERN.match(line):
+        return "tip"
+    return "text"
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def validate_reply(text, max_words=100, min_bullets=3, max_bullets=5):
+    """Return how a reply breaks the response format: an empty list when it follows it
+
+    The format is a one-line answer, 3-5 bullets, one tip and a closing
+    follow-up question, under max_words words in total.
+    """
+    lines = [line.strip() for line in text.strip().splitlines() if line.strip()]
+    if not lines:
+        return ["empty"]
+
+    kinds = [line_kind(line) for line in lines]
+    problems = []
+    if kinds[0] != "text":
+        problems.append("no_answer_line")
+    bullets = kinds.count("bullet")
+    if bullets < min_bullets:
+        problems.append("too_few_bullets")
+    elif bullets > max_bullets:
+        problems.append("too_many_bullets")
+    if "tip" not in kinds:
+        problems.append("no_tip")
+    if not lines[-1].endswith("?"):
+        problems.append("no_follow_up_question")
+    if count_words(text) > max_words:
+        problems.append("too_long")
+    return problems
+
+
+class ReplyShaper:
+    """Streams a model reply through the response format, dropping whatever goes past it
+
+    Keeps the opening answer, at most max_bullets bullets, one tip and the
+    follow-up question. Bullets and prose past max_words, extra tips and
+    prose between the bullets and the question are dropped. Kept lines
+    stream through as they arrive; only lines that may turn out to be the
+    follow-up question wait for their line end. Once the question is out
+    the reply is complete (done), so the caller can stop reading the
+    model's stream instead of paying for a runaway reply.
+    """
+
+    # Characters needed to tell a bullet or tip line from plain text
+    LOOKAHEAD = 4
+
+    def __init__(self, max_words=120, max_bullets=5):
+        self.max_words = max_words
+        self.max_bullets = max_bullets
+        self.done = False
+        self.dropped = 0
+        self._line = ""
+        self._decision = None
+        self._kind = None
+        self._words = 0
+        self._bullets = 0
+        self._has_tip = False
+        self._answered = False
+        self._emitted = False
+        self._blank_pending = False
+
+    def feed(self, chunk):
+        """Take the next chunk of the model's reply; return the text to show now"""
+        output = []
+        for piece in re.split(r"(\n)", chunk):
+            if self.done:
+                break
+            if piece == "\n":
+                output.append(self._end_line(final=False))
+            elif piece:
+                output.append(self._add(piece))
+        return "".join(output)
+
+    def finish(self):
+        """Return what is left to show once the model's reply has ended"""
+        if self.done or not self._line.strip():
+            return ""
+        return self._end_line(final=True)
+
+    def _add(self, piece):
+        self._line += piece
+        if self._decision is None and len(self._line.lstrip()) >= self.LOOKAHEAD:
+            self._decide(self._line)
+            if self._decision == "keep":
+                return self._start_output() + self._line
+            return ""
+        if self._decision == "keep":
+            return piece
+        return ""
+
+    def _decide(self, line):
+        """Decide from the start of a line whether to keep it, drop it or hold it until it ends"""
+        self._kind = line_kind(line.strip())
+        if self._kind == "bullet":
+            keep = self._bullets < self.max_bullets and self._words < self.max_words
+            self._bullets += keep
+        elif self._kind == "tip":
+            keep = not self._has_tip
+            self._has_tip = True
+        elif not self._answered:
+            keep = True
+            self._answered = True
+        else:
+            # Could be the follow-up question or extra prose; only the line end tells
+            self._decision = "hold"
+            return
+        self._decision = "keep" if keep else "drop"
+
+    def _start_output(self):
+        """Separator to emit before a kept line: a blank line where the model had one"""
+        prefix = "\n" if self._emitted else ""
+        if self._blank_pending and self._emitted:
+            prefix += "\n"
+        self._blank_pending = False
+        self._emitted = True
+        return prefix
+
+    def _end_line(self, final):
+        line, self._line = self._line, ""
+        decision, self._decision = self._decision, None
+        if not line.strip():
+            self._blank_pending = True
+            return ""
+
+        if decision is None:
+            # A line shorter than LOOKAHEAD is only classified at its end
+            self._decide(line)
+            decision = self._decision
+            self._decision = None
+            if decision == "keep":
+                self._words += count_words(line)
+                return self._start_output() + line
+
+        if decision == "hold":
+            words = count_words(line)
+            if line.rstrip().endswith("?"):
+                # The follow-up question closes the reply
+                self.done = True
+                self._words += words
+                return self._start_output() + line
+            # Prose continuing the answer is fine until the bullets start
+            if self._bullets == 0 and not self._has_tip and self._words + words <= self.max_words:
+                self._words += words
+                return self._start_output() + line
+            decision = "drop"
+
+        if decision == "drop":
+            self.dropped += 1
+            return ""
+        self._words += count_words(line)
+        return ""
+
+
+def shape_reply(text, max_words=120, max_bullets=5):
+    """Trim a complete reply to the response format"""
+    shaper = ReplyShaper(max_words=max_words, max_bullets=max_bullets)
+    return shaper.feed(text) + shaper.finish()
@@ -0,0 +1,408 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_backends import BackendError, DeadlineExceededError, Reply, RequestCancelledError, TransientBackendError
+
+
+class SchedulerBusyError(TransientBackendError):
+    """The request queue is full"""
+
+
+class TokenBucket:
+    """Token-bucket rate limiter: `rate` requests per second with bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Take one token, sleeping until one is available; returns the time spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def try_acquire(self):
+        """Take one token if one is available right now"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class SharedReply(Reply):
+    """A reply produced once by a scheduler worker and streamed to any number of readers
+
+    Every iteration starts from the first chunk and then follows the
+    worker as new chunks arrive, so callers coalesced onto the same
+    request all see the complete reply. Each caller reads the reply once;
+    when every reader has stopped before the end (it was superseded, or
+    its deadline passed) the reply is cancelled and the worker stops
+    generating it.
+    """
+
+    def __init__(self, deadline=None):
+        super().__init__()
+        self.done = False
+        self.error = None
+        self.cancelled = False
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.wait_time = None
+        self.owner = None
+        self._readers = 0
+        self._attempts = 0
+        self._chunks = []
+        self._cond = threading.Condition()
+
+    def attach(self):
+        """Register one more caller that will read this reply; False if it was already cancelled"""
+        with self._cond:
+            if self.cancelled:
+                return False
+            self._readers += 1
+            return True
+
+    def release(self):
+        """Unregister a caller; the reply is cancelled when nobody is left to read it"""
+        with self._cond:
+            self._readers -= 1
+            if self._readers <= 0 and not self.done:
+                self.cancelled = True
+                self._cond.notify_all()
+
+    def remaining(self):
+        """Seconds left until the deadline (None without one)"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def start_attempt(self):
+        with self._cond:
+            self._attempts += 1
+
+    def end_attempt(self):
+        """Mark one attempt as finished; returns whether another attempt is still running"""
+        with self._cond:
+            self._attempts -= 1
+            return self._attempts > 0
+
+    def claim(self, attempt):
+        """Make `attempt` the one whose chunks are used; False if another attempt got there first"""
+        with self._cond:
+            if self.owner is None:
+                self.owner = attempt
+            return self.owner is attempt
+
+    def push(self, chunk):
+        with self._cond:
+            self._chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, usage):
+        with self._cond:
+            self.text = "".join(self._chunks)
+            self.usage = usage
+            self.done = True
+            self._cond.notify_all()
+
+    def fail(self, error):
+        with self._cond:
+            if self.done:
+                return
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    @property
+    def has_output(self):
+        with self._cond:
+            return bool(self._chunks)
+
+    def chunks(self, heartbeat=None):
+        """Yield the reply's chunks, and an empty string every `heartbeat` seconds while none arrive
+
+        Raises DeadlineExceededError if the deadline passes first.
+        """
+        index = 0
+        try:
+            while True:
+                with self._cond:
+                    while index == len(self._chunks) and not self.done:
+                        remaining = self.remaining()
+                        if remaining == 0:
+                            raise DeadlineExceededError("The model took too long to answer")
+                        timeout = remaining if heartbeat is None else min(heartbeat, remaining or heartbeat)
+                        if not self._cond.wait(timeout) and heartbeat is not None:
+                            break
+                    new_chunks = self._chunks[index:]
+                    finished = self.done
+                    error = self.error
+                if not new_chunks and not finished:
+                    yield ""
+                    continue
+                for chunk in new_chunks:
+                    yield chunk
+                index += len(new_chunks)
+                if finished and not new_chunks:
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            self.release()
+
+    def __iter__(self):
+        return self.chunks()
+
+
+class RequestScheduler:
+    """Process-wide gate in front of a model backend
+
+    Requests run on a bounded worker pool behind a token-bucket rate
+    limiter. Retryable errors are retried with exponential backoff and
+    jitter as long as nothing has been streamed yet and the deadline
+    allows it. Requests submitted with the same key while one is in
+    flight share a single upstream call. A request nobody reads any more
+    is cancelled between chunks, so its worker is freed.
+
+    With hedge_percentile set, a request whose first chunk is slower than
+    that percentile of recent first-chunk times gets a second attempt on
+    a free worker (if the rate limit allows it); the first attempt to
+    produce a chunk is used and the other is stopped.
+    """
+
+    # First-chunk times needed before hedging starts
+    HEDGE_MIN_SAMPLES = 20
+
+    def __init__(self, backend, max_concurrent=4, max_queue=64, requests_per_minute=60, burst=5,
+                 max_retries=3, base_delay=0.5, max_delay=8.0, timeout=60.0, hedge_percentile=None):
+        self.backend = backend
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self._bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="dg-llm")
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._counters = {
+            "requests": 0, "coalesced": 0, "retries": 0, "rejected": 0, "failed": 0,
+            "cancelled": 0, "deadline_exceeded": 0, "hedged": 0, "hedge_wins": 0,
+        }
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._started = 0
+        self._first_chunk_times = deque(maxlen=200)
+
+    def stream(self, history, message, key=None, timeout=None):
+        """Schedule a request and return a SharedReply to iterate for its chunks
+
+        Requests with the same non-None key share one upstream call while it
+        is in flight. timeout (default: the scheduler's) is the deadline in
+        seconds for the whole reply.
+        """
+        with self._lock:
+            self._counters["requests"] += 1
+            flight = self._flights.get(key) if key is not None else None
+            # attach() checks for cancellation under the reply's own lock, so a
+            # flight its last reader just released is replaced, not joined
+            if flight is not None and flight.attach():
+                self._counters["coalesced"] += 1
+                return flight
+
+            if self._queued >= self.max_queue:
+                self._counters["rejected"] += 1
+                raise SchedulerBusyError("Too many requests are waiting for the model, please try again")
+
+            timeout = self.timeout if timeout is None else timeout
+            reply = SharedReply(deadline=time.monotonic() + timeout if timeout else None)
+            reply.attach()
+            if key is not None:
+                self._flights[key] = reply
+            self._queued += 1
+
+        self._pool.submit(self._run, reply, key, history, message)
+        self._schedule_hedge(reply, key, history, message)
+        return reply
+
+    def generate(self, history, message, key=None, timeout=None):
+        """Schedule a request and wait for the complete reply"""
+        reply = self.stream(history, message, key, timeout)
+        for _ in reply:
+            pass
+        return reply
+
+    def _backoff(self, attempt):
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _hedge_delay(self):
+        """The first-chunk time past which a request is hedged, or None"""
+        if self.hedge_percentile is None:
+            return None
+        with self._lock:
+            samples = sorted(self._first_chunk_times)
+        if len(samples) < self.HEDGE_MIN_SAMPLES:
+            return None
+        rank = min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))
+        return samples[rank]
+
+    def _schedule_hedge(self, reply, key, history, message, delay=None):
+        delay = self._hedge_delay() if delay is None else delay
+        if delay is None:
+            return
+        timer = threading.Timer(delay, self._maybe_hedge, args=(reply, key, history, message))
+        timer.daemon = True
+        timer.start()
+
+    def _maybe_hedge(self, reply, key, history, message):
+        """Start a second attempt if the first is still waiting for its first chunk"""
+        if reply.done or reply.cancelled or reply.has_output or reply.expired:
+            return
+        if reply.started_at is None:
+            # Still queued: a second attempt would only add to the queue
+            return
+        delay = self._hedge_delay()
+        waited = time.monotonic() - reply.started_at
+        if delay is not None and waited < delay:
+            self._schedule_hedge(reply, key, history, message, delay - waited)
+            return
+        with self._lock:
+            if self._running + self._queued >= self.max_concurrent:
+                return
+        if not self._bucket.try_acquire():
+            return
+        with self._lock:
+            self._counters["hedged"] += 1
+        self._pool.submit(self._run, reply, key, history, message, True)
+
+    def _check(self, reply):
+        """Raise if the reply is no longer wanted"""
+        # Readers give up at the deadline, which cancels the reply too; count it as expired
+        if reply.expired:
+            raise DeadlineExceededError("The model took too long to answer")
+        if reply.cancelled:
+            raise RequestCancelledError("Nobody is waiting for this reply")
+
+    def _run(self, reply, key, history, message, hedge=False):
+        attempt_id = object()
+        reply.start_attempt()
+        with self._lock:
+            if not hedge:
+                self._queued -= 1
+            self._running += 1
+        error = None
+        try:
+            if not hedge:
+                if not reply.cancelled and not reply.expired:
+                    self._bucket.acquire()
+                reply.wait_time = time.monotonic() - reply.enqueued_at
+                reply.started_at = time.monotonic()
+                with self._lock:
+                    self._started += 1
+                    self._total_wait += reply.wait_time
+                    self._max_wait = max(self._max_wait, reply.wait_time)
+
+            attempt = 0
+            while True:
+                self._check(reply)
+                try:
+                    started = time.monotonic()
+                    upstream = self.backend.stream(history, message, timeout=reply.remaining())
+                    for chunk in upstream:
+                        if reply.owner is not attempt_id:
+                            if not reply.claim(attempt_id):
+                                # The other attempt answered first
+                                return
+                            self._record_first_chunk(time.monotonic() - started, hedge)
+                        reply.push(chunk)
+                        # Returning early closes the upstream stream
+                        self._check(reply)
+                    if reply.claim(attempt_id):
+                        reply.finish(upstream.usage)
+                    return
+                except BackendError as e:
+                    if reply.owner not in (None, attempt_id):
+                        return
+                    # Once chunks went out a retry would repeat them, so only retry before that
+                    delay = self._backoff(attempt)
+                    remaining = reply.remaining()
+                    if (e.retryable and attempt < self.max_retries and not reply.has_output
+                            and (remaining is None or delay < remaining)):
+                        with self._lock:
+                            self._counters["retries"] += 1
+                        time.sleep(delay)
+                        attempt += 1
+                        self._bucket.acquire()
+                        continue
+                    raise
+        except BackendError as e:
+            error = e
+        except Exception as e:
+            error = BackendError(str(e))
+        finally:
+            others_running = reply.end_attempt()
+            # A failed attempt only fails the reply if it owns it or was the last one left
+            if error is not None and (reply.owner is attempt_id or (reply.owner is None and not others_running)):
+                self._fail(reply, error)
+            with self._lock:
+                self._running -= 1
+                if key is not None and self._flights.get(key) is reply and (reply.done or reply.cancelled):
+                    del self._flights[key]
+
+    def _record_first_chunk(self, seconds, hedge):
+        with self._lock:
+            self._first_chunk_times.append(seconds)
+            if hedge:
+                self._counters["hedge_wins"] += 1
+
+    def _fail(self, reply, error):
+        with self._lock:
+            if isinstance(error, RequestCancelledError):
+                self._counters["cancelled"] += 1
+            elif isinstance(error, DeadlineExceededError):
+                self._counters["deadline_exceeded"] += 1
+            else:
+                self._counters["failed"] += 1
+        reply.fail(error)
+
+    def stats(self):
+        """Return queue depth, concurrency, wait times and request counters for capacity planning"""
+        with self._lock:
+            return {
+                "queue_depth": self._queued,
+                "in_flight": self._running,
+                "max_concurrent": self.max_concurrent,
+                "avg_wait": self._total_wait / self._started if self._started else 0.0,
+                "max_wait": self._max_wait,
+                **self._counters,
+            }
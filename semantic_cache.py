@@ -0,0 +1,194 @@
+import difflib
+import json
+import logging
+import math
+import re
+import threading
+import time
+import zlib
+from logging.handlers import RotatingFileHandler
+
+from knowledge import tokenize
+from response_cache import normalize_question
+
+try:
+    import numpy
+except ImportError:
+    # Optional: without NumPy the index searches with sparse pure-Python dot products
+    numpy = None
+
+# Weights of the hashed features: whole words, word pairs and letter trigrams (for typos)
+WORD_WEIGHT = 1.0
+PAIR_WEIGHT = 0.5
+TRIGRAM_WEIGHT = 0.3
+
+
+def question_vector(text, dims=1024):
+    """Embed a question as a unit-length sparse vector {dimension: weight} of hashed n-grams
+
+    Stopwords, single digits and plurals are dropped first (the knowledge
+    base's tokenizer), so "top attractions in Dubai?" and "What are the
+    top 5 attractions?" share all their features. Hashing uses CRC32,
+    which is stable across processes, with a hash-derived sign so
+    colliding features tend to cancel rather than add up.
+    """
+    tokens = tokenize(normalize_question(text))
+    features = [(token, WORD_WEIGHT) for token in tokens]
+    features += [(f"{a} {b}", PAIR_WEIGHT) for a, b in zip(tokens, tokens[1:])]
+    for token in tokens:
+        padded = f"#{token}#"
+        features += [(f"#{padded[i:i + 3]}", TRIGRAM_WEIGHT) for i in range(len(padded) - 2)]
+
+    vector = {}
+    for feature, weight in features:
+        hashed = zlib.crc32(feature.encode("utf-8"))
+        index = hashed % dims
+        vector[index] = vector.get(index, 0.0) + (weight if hashed & 0x80000000 else -weight)
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    return {index: value / norm for index, value in vector.items() if value} if norm else {}
+
+
+def content_words(text):
+    """The content words of a question: no stopwords, single digits or one-letter leftovers ("what s")"""
+    return frozenset(word for word in tokenize(normalize_question(text)) if len(word) > 1)
+
+
+def words_covered(words, others, cutoff=0.8):
+    """Whether every word has an equal or typo-close counterpart in others"""
+    return all(word in others or difflib.get_close_matches(word, others, n=1, cutoff=cutoff) for word in words)
+
+
+def numbers_in(text):
+    """The numbers a question mentions"""
+    return frozenset(re.findall(r"\d+(?:\.\d+)?", text))
+
+
+def numbers_agree(a, b):
+    """Two questions that both mention numbers must mention the same ones ("under 100 AED" vs "under 200 AED")"""
+    return not a or not b or a == b
+
+
+class SimilarMatch:
+    """A previously answered question close enough to a new one: its cache key and cosine similarity"""
+
+    __slots__ = ("key", "question", "score")
+
+    def __init__(self, key, question, score):
+        self.key = key
+        self.question = question
+        self.score = score
+
+
+class SimilarityIndex:
+    """CPU-only nearest-neighbour index over previously answered questions
+
+    Each question is stored with the response cache key of its answer.
+    search() returns the most similar stored question at or above
+    threshold (cosine similarity of the hashed n-gram vectors), unless
+    the two mention different numbers or either has a content word the
+    other lacks (allowing for typos): "top 5 attractions for kids" and
+    "is Dubai not safe" score high against "top 5 attractions" and "is
+    Dubai safe" but ask something else. With NumPy the vectors live in one
+    preallocated matrix and a search is a single matrix-vector product;
+    without it, a sparse dot product per stored question. Past max_size
+    the oldest questions are overwritten.
+    """
+
+    def __init__(self, threshold=0.8, max_size=256, dims=1024):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.dims = dims
+        self._rows = [None] * max_size
+        self._slots = {}
+        self._next = 0
+        self._matrix = numpy.zeros((max_size, dims), dtype=numpy.float32) if numpy is not None else None
+        self._lock = threading.Lock()
+
+    def add(self, question, key):
+        """Remember that key holds the answer to question"""
+        vector = question_vector(question, self.dims)
+        if not vector:
+            return
+        with self._lock:
+            if key in self._slots:
+                return
+            slot = self._next
+            self._next = (self._next + 1) % self.max_size
+            if self._rows[slot] is not None:
+                del self._slots[self._rows[slot][0]]
+            self._rows[slot] = (key, question, numbers_in(question), vector, content_words(question))
+            self._slots[key] = slot
+            if self._matrix is not None:
+                self._matrix[slot] = 0.0
+                self._matrix[slot, list(vector)] = list(vector.values())
+
+    def discard(self, key):
+        """Forget a question, e.g. once its answer has left the response cache"""
+        with self._lock:
+            slot = self._slots.pop(key, None)
+            if slot is not None:
+                self._rows[slot] = None
+                if self._matrix is not None:
+                    self._matrix[slot] = 0.0
+
+    def _scores(self, vector):
+        """Cosine similarity of a query vector to every slot (0 for empty slots)"""
+        if self._matrix is not None:
+            query = numpy.zeros(self.dims, dtype=numpy.float32)
+            query[list(vector)] = list(vector.values())
+            return (self._matrix @ query).tolist()
+        return [
+            sum(value * row[3].get(index, 0.0) for index, value in vector.items()) if row is not None else 0.0
+            for row in self._rows
+        ]
+
+    def search(self, question):
+        """Return the closest stored question as a SimilarMatch, or None below the threshold"""
+        vector = question_vector(question, self.dims)
+        if not vector:
+            return None
+        numbers = numbers_in(question)
+        words = content_words(question)
+        with self._lock:
+            if not self._slots:
+                return None
+            best = None
+            for slot, score in enumerate(self._scores(vector)):
+                row = self._rows[slot]
+                if row is None or score < self.threshold or not numbers_agree(row[2], numbers):
+                    continue
+                if best is not None and score <= best.score:
+                    continue
+                if words_covered(words, row[4]) and words_covered(row[4], words):
+                    best = SimilarMatch(row[0], row[1], score)
+            return best
+
+    def __len__(self):
+        with self._lock:
+            return len(self._slots)
+
+
+class MatchAuditLog:
+    """Rotating JSONL log of every answer served for a similar (not identical) question"""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self._logger = logging.getLogger(f"dubai_genie.semantic.{path}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        if not self._logger.handlers:
+            # The file is only created once something is matched
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8",
+                                          delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+
+    def record(self, question, match, threshold, **fields):
+        self._logger.info(json.dumps({
+            "ts": time.time(),
+            "question": question,
+            "matched_question": match.question,
+            "score": round(match.score, 4),
+            "threshold": threshold,
+            "key": match.key,
+            **fields,
+        }, ensure_ascii=False))
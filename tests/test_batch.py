@@ -0,0 +1,23 @@
+import json
+
+from batch import load_finished
+
+
+def test_resume_drops_failed_and_cut_off_results(tmp_path):
+    output = tmp_path / "answers.jsonl"
+    lines = [
+        {"id": 1, "turns": []},
+        {"id": 2, "turns": [], "error": "QuotaExceededError"},
+        {"id": 3, "turns": []},
+    ]
+    output.write_text("".join(json.dumps(line) + "\n" for line in lines) + '{"id": 4, "tu')
+    assert load_finished(str(output)) == {1, 3}
+    assert [json.loads(line)["id"] for line in output.read_text().splitlines()] == [1, 3]
+
+
+def test_resume_leaves_a_clean_file_alone(tmp_path):
+    output = tmp_path / "answers.jsonl"
+    output.write_text('{"id": 1, "turns": []}\n')
+    before = output.stat().st_mtime_ns
+    assert load_finished(str(output)) == {1}
+    assert output.stat().st_mtime_ns == before
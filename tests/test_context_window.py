@@ -0,0 +1,40 @@
+from context_window import ContextWindow
+from conversation_db import ConversationDB
+from conversation_store import make_prefix
+from prompts import initial_message
+
+
+def test_fit_restored_conversation_with_spilled_turns(tmp_path):
+    db = ConversationDB(str(tmp_path / "history.sqlite3"))
+    for seq in range(24):
+        role = "user" if seq % 2 == 0 else "assistant"
+        db.append("session", seq, role, f"{role} message {seq}")
+
+    store = db.restore("session", make_prefix(initial_message), page_size=20)
+    assert store.spilled == 4
+    store.append({"role": "user", "content": "Is the metro cheap?"})
+
+    window = ContextWindow(max_tokens=2000, summary_tokens=300)
+    summary, recent = window.fit(store, end=len(store) - 1)
+
+    # Only turns still in memory are sent, oldest first and starting on a user turn
+    assert recent[0]["content"] == "user message 4"
+    assert recent[-1]["content"] == "assistant message 23"
+
+    # Later turns keep working on the same window
+    store.append({"role": "assistant", "content": "Yes, 8-14 AED per trip."})
+    store.append({"role": "user", "content": "Does it go to the airport?"})
+    summary, recent = window.fit(store, end=len(store) - 1)
+    assert recent[-1]["content"] == "Yes, 8-14 AED per trip."
+
+
+def test_fit_small_budget_stops_at_spilled_turns(tmp_path):
+    db = ConversationDB(str(tmp_path / "history.sqlite3"))
+    for seq in range(30):
+        db.append("session", seq, "user" if seq % 2 == 0 else "assistant", "word " * 40)
+    store = db.restore("session", make_prefix(initial_message), page_size=20)
+
+    window = ContextWindow(max_tokens=200, summary_tokens=50)
+    summary, recent = window.fit(store)
+    assert 0 < len(recent) < 20
+    assert recent[0]["role"] == "user"
@@ -0,0 +1,34 @@
+import pytest
+
+from intents import IntentRouter
+from prompts import quick_prompts
+
+
+@pytest.fixture
+def router():
+    return IntentRouter(canned_answers=[(prompt["text"], f"canned: {prompt['text']}") for prompt in quick_prompts])
+
+
+@pytest.mark.parametrize("message", [
+    "When is the best time to visit Abu Dhabi?",
+    "What can I do for under 200 AED?",
+    "what are 3 important local dishes?",
+    "What are the top 10 attractions?",
+])
+def test_different_questions_are_not_canned(router, message):
+    assert router.classify(message) is None
+
+
+@pytest.mark.parametrize("message, prompt", [
+    ("what are the top 5 attractions", "What are the top 5 attractions?"),
+    ("Top 5 attractions?", "What are the top 5 attractions?"),
+    ("When's the best time to visit", "When is the best time to visit?"),
+    ("What can I do for under 100 AED", "What can I do for under 100 AED?"),
+])
+def test_rewordings_of_canned_questions_match(router, message, prompt):
+    assert router.classify(message) == ("canned", f"canned: {prompt}")
+
+
+@pytest.mark.parametrize("message, intent", [("hello!", "greeting"), ("thank yuo", "thanks"), ("helo", "greeting")])
+def test_small_talk_still_matches_fuzzily(router, message, intent):
+    assert router.classify(message)[0] == intent
@@ -0,0 +1,49 @@
+import pytest
+
+from itinerary import answer_plan_request, parse_plan_request, plan_day
+
+
+@pytest.mark.parametrize("message", [
+    "I have a day trip to Abu Dhabi, what should I pack?",
+    "Plan a day in Abu Dhabi under 200 AED",
+    "plan a day with kids at the aquarium",
+])
+def test_messages_that_are_not_plan_requests_are_left_to_the_model(message):
+    assert parse_plan_request(message) is None
+    assert answer_plan_request(message) is None
+
+
+def test_plan_request_is_parsed():
+    request = parse_plan_request("Can you make me a one day itinerary from the Marina starting at 10am, "
+                                 "including the Burj Khalifa, under 300 AED?")
+    assert (request.budget, request.start, request.start_time, request.include) == (
+        300, "Dubai Marina", "10:00", ("burj_khalifa",))
+
+
+@pytest.mark.parametrize("budget, start", [(60, "Dubai Marina"), (150, "Dubai Marina"), (200, "Downtown")])
+def test_plan_cost_includes_the_leg_back(budget, start):
+    plan = plan_day(budget=budget, start=start)
+    assert plan is not None
+    legs = [stop.leg.cost for stop in plan.stops] + [plan.back.cost]
+    tickets = [stop.attraction["cost"][0] for stop in plan.stops]
+    assert plan.cost == sum(legs) + sum(tickets) <= budget
+    assert plan.end == plan.stops[-1].end + plan.back.minutes
+
+
+def test_start_area_after_a_start_time_is_found():
+    request = parse_plan_request("Plan my day starting at 2pm from the marina")
+    assert (request.start, request.start_time) == ("Dubai Marina", "14:00")
+
+
+@pytest.mark.parametrize("message", ["plan a day starting at 11:30 pm", "plan a day starting at 3"])
+def test_start_time_the_planner_cannot_use_is_left_to_the_model(message):
+    assert parse_plan_request(message) is None
+
+
+def test_safari_day_from_downtown():
+    plan = plan_day(start="Downtown", include=("desert_safari",))
+    assert plan is not None
+    assert plan.stops[-1].attraction["id"] == "desert_safari"
+    # The tour drops you back at the hotel
+    assert plan.back.minutes == 0 and plan.end == plan.stops[-1].end
+    assert answer_plan_request("Plan a day with a desert safari") is not None
@@ -0,0 +1,29 @@
+import pytest
+
+from knowledge import build_index
+from prompts import quick_prompts
+
+
+@pytest.fixture(scope="module")
+def index():
+    return build_index()
+
+
+@pytest.mark.parametrize("question", [
+    "When is the best time to visit the Burj Khalifa?",
+    "Best time to visit the Dubai Frame?",
+    "hotels under 100 AED",
+    "restaurants under 100 AED",
+    "Is the desert safari safe?",
+])
+def test_topic_answers_skip_questions_about_something_else(index, question):
+    assert index.answer(question) is None
+
+
+@pytest.mark.parametrize("question", [prompt["text"] for prompt in quick_prompts] + [
+    "Is Dubai safe for women?",
+    "best month to visit dubai",
+    "free things to do in dubai",
+])
+def test_topic_questions_are_answered(index, question):
+    assert index.answer(question) is not None
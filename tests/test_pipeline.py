@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from knowledge import build_index
+from llm_backends import StubBackend
+from pipeline import AnswerPipeline
+from response_cache import ResponseCache
+from scheduler import RequestScheduler
+from semantic_cache import MatchAuditLog, SimilarityIndex
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    return AnswerPipeline(
+        RequestScheduler(StubBackend(), requests_per_minute=100000),
+        ResponseCache(),
+        "test",
+        build_index(),
+        kb_answers=False,
+        similar=SimilarityIndex(),
+        audit_log=MatchAuditLog(str(tmp_path / "matches.jsonl")),
+    )
+
+
+def ask(pipeline, question, first_question=True):
+    turn = {"session": "s1"}
+    answer = pipeline.answer_locally(question, first_question, turn)
+    if answer is None:
+        answer = "".join(pipeline.stream_reply([], question, first_question, turn))
+    return answer, turn
+
+
+def test_paraphrase_is_served_from_cache_and_audited(pipeline, tmp_path):
+    answer, _ = ask(pipeline, "How do I get to the Burj Khalifa from the airport?")
+    again, turn = ask(pipeline, "How to get to the Burj Khalifa from the airport?")
+    assert again == answer
+    assert turn["cache_hit"] and turn["similar_to"] == "How do I get to the Burj Khalifa from the airport?"
+    record = json.loads((tmp_path / "matches.jsonl").read_text().splitlines()[0])
+    assert record["session"] == "s1"
+
+
+def test_stale_similar_question_is_dropped(pipeline):
+    ask(pipeline, "How do I get to the Burj Khalifa from the airport?")
+    pipeline.cache.clear()
+    _, turn = ask(pipeline, "How to get to the Burj Khalifa from the airport?")
+    assert not turn["cache_hit"]
+    # The new answer replaced the expired one in the index
+    assert len(pipeline.similar) == 1
+
+
+def test_follow_up_questions_skip_the_caches(pipeline):
+    ask(pipeline, "Is the metro cheap?")
+    _, turn = ask(pipeline, "Is the metro cheap?", first_question=False)
+    assert not turn["cache_hit"] and "format_problems" in turn
+
+
+def test_topic_answers_only_open_a_conversation(pipeline):
+    pipeline.kb_answers = True
+    _, turn = ask(pipeline, "Is it safe?")
+    assert turn.get("kb_hit")
+    _, turn = ask(pipeline, "Is it safe?", first_question=False)
+    assert not turn.get("kb_hit")
+
+
+def test_reply_joined_from_another_questions_flight_is_not_cached(pipeline):
+    reply = pipeline.scheduler.stream([], "Tell me more about Dubai Mall", key="prefetch:1")
+    turn = {}
+    text = "".join(pipeline.stream_reply([], "Dubai Mall please", True, turn, flight_key="prefetch:1"))
+    "".join(reply.chunks())
+    assert text
+    assert pipeline.cache_key("Dubai Mall please") not in pipeline.cache
+    assert len(pipeline.similar) == 0
+
+
+def test_answered_locally_checks_the_knowledge_base_for_opening_questions(pipeline):
+    pipeline.kb_answers = True
+    assert pipeline.answered_locally("Is Dubai safe for women?", first_question=True)
+    assert not pipeline.answered_locally("Is Dubai safe for women?", first_question=False)
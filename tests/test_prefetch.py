@@ -0,0 +1,41 @@
+import pytest
+
+from prefetch import FollowUp, PrefetchCache
+
+
+@pytest.fixture
+def cache():
+    cache = PrefetchCache()
+    for follow_up in [
+        FollowUp("Tell me more about Dubai Mall", ["Dubai Mall"]),
+        FollowUp("Tell me more about Metro", ["Metro"]),
+        FollowUp("Tell me about places to visit in Dubai", ["places to visit in Dubai"]),
+        FollowUp("What are the top 5 attractions?"),
+        FollowUp("How much does a day in Dubai cost?"),
+    ]:
+        cache.add(follow_up, key=follow_up.question)
+    return cache
+
+
+@pytest.mark.parametrize("message", [
+    "Dubai Mall parking fees",
+    "Dubai Mall opening hours",
+    "is the metro open late",
+    "metro to the airport?",
+    "places to visit in abu dhabi",
+    "top 10 attractions",
+    "How much does a week in Dubai cost?",
+])
+def test_different_questions_do_not_match(cache, message):
+    assert cache.match(message) is None
+
+
+@pytest.mark.parametrize("message, question", [
+    ("the Dubai Mall please", "Tell me more about Dubai Mall"),
+    ("metro", "Tell me more about Metro"),
+    ("top 5 attractions", "What are the top 5 attractions?"),
+    ("how much does a day in dubai cost", "How much does a day in Dubai cost?"),
+    ("Places to visit", "Tell me about places to visit in Dubai"),
+])
+def test_same_question_matches(cache, message, question):
+    assert cache.match(message).key == question
@@ -0,0 +1,47 @@
+import pytest
+
+from response_format import ReplyShaper, shape_reply, validate_reply
+
+REPLY = """Dubai has 5 must-see attractions.
+
+• Burj Khalifa - World's tallest building
+• Dubai Mall - Huge shopping center
+• C
+
+Tip: Buy tickets online.
+
+Ok?"""
+
+
+def shape_in_chunks(text, size, **kwargs):
+    shaper = ReplyShaper(**kwargs)
+    output = [shaper.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    output.append(shaper.finish())
+    return "".join(output), shaper
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, len(REPLY)])
+def test_short_lines_are_kept_at_any_chunk_size(size):
+    text, shaper = shape_in_chunks(REPLY, size)
+    assert text == REPLY
+    assert shaper.done
+    assert shaper.dropped == 0
+
+
+@pytest.mark.parametrize("size", [1, 2, 7])
+def test_short_bullet_past_the_limit_is_dropped(size):
+    reply = "Answer.\n\n• A\n• B\n• C\n\nTip: Go early.\n\nOk?"
+    text, shaper = shape_in_chunks(reply, size, max_bullets=2)
+    assert text == "Answer.\n\n• A\n• B\n\nTip: Go early.\n\nOk?"
+    assert shaper.dropped == 1
+
+
+def test_text_after_the_follow_up_question_is_cut():
+    reply = "Answer.\n\n• A\n• B\n• C\n\nTip: Go early.\n\nOk?\n\nQuestion: more"
+    assert shape_reply(reply) == "Answer.\n\n• A\n• B\n• C\n\nTip: Go early.\n\nOk?"
+
+
+def test_validate_reply():
+    assert validate_reply(REPLY) == []
+    assert validate_reply("Just one line") == ["too_few_bullets", "no_tip", "no_follow_up_question"]
+    assert validate_reply("") == ["empty"]
@@ -0,0 +1,128 @@
+import threading
+import time
+
+import pytest
+
+from llm_backends import DeadlineExceededError, RequestCancelledError, StubBackend, TransientBackendError
+from scheduler import RequestScheduler, SharedReply, TokenBucket
+
+
+class ScriptedBackend(StubBackend):
+    """The stub backend with a scripted delay before the first chunk, or error, per call"""
+
+    def __init__(self, script=(), **settings):
+        super().__init__(**settings)
+        self.script = list(script)
+
+    def _stream(self, history, message, reply, timeout=None):
+        with self._lock:
+            step = self.script.pop(0) if self.script else None
+        if isinstance(step, Exception):
+            with self._lock:
+                self.calls += 1
+            raise step
+        if step:
+            time.sleep(step)
+        yield from super()._stream(history, message, reply, timeout)
+
+
+def scheduler_for(backend, **settings):
+    settings.setdefault("requests_per_minute", 60000)
+    settings.setdefault("burst", 100)
+    return RequestScheduler(backend, **settings)
+
+
+def test_callers_with_the_same_key_share_one_backend_call():
+    backend = ScriptedBackend([0.2])
+    scheduler = scheduler_for(backend)
+    first = scheduler.stream([], "Is the metro cheap?", key="k")
+    second = scheduler.stream([], "Is the metro cheap?", key="k")
+    assert second is first
+    texts = []
+    readers = [threading.Thread(target=lambda reply=reply: texts.append("".join(reply))) for reply in (first, second)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join(5)
+    assert len(texts) == 2 and texts[0] == texts[1] and texts[0]
+    assert backend.calls == 1
+    assert scheduler.stats()["coalesced"] == 1
+
+
+def test_cancelled_reply_cannot_be_joined():
+    reply = SharedReply()
+    assert reply.attach()
+    reply.release()
+    assert reply.cancelled and not reply.attach()
+
+
+def test_request_after_the_last_reader_left_starts_a_new_flight():
+    backend = ScriptedBackend([0.3])
+    scheduler = scheduler_for(backend)
+    abandoned = scheduler.stream([], "Is the metro cheap?", key="k")
+    abandoned.release()
+    reply = scheduler.stream([], "Is the metro cheap?", key="k")
+    assert reply is not abandoned
+    assert "".join(reply)
+    assert scheduler.stats()["coalesced"] == 0
+
+
+def test_token_bucket_paces_requests_past_the_burst():
+    bucket = TokenBucket(rate=20, capacity=2)
+    assert bucket.acquire() == 0 and bucket.acquire() == 0
+    start = time.monotonic()
+    assert bucket.acquire() > 0
+    assert time.monotonic() - start >= 0.04
+    assert not bucket.try_acquire()
+
+
+def test_transient_error_is_retried():
+    backend = ScriptedBackend([TransientBackendError("dropped connection")])
+    scheduler = scheduler_for(backend, base_delay=0.01)
+    reply = scheduler.generate([], "Is the metro cheap?")
+    assert reply.text and reply.error is None
+    assert backend.calls == 2
+    assert scheduler.stats()["retries"] == 1
+
+
+def wait_until_idle(scheduler, timeout=5):
+    deadline = time.monotonic() + timeout
+    while scheduler.stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_worker_stops_when_its_reader_cancels():
+    backend = ScriptedBackend(tokens_per_second=200)
+    scheduler = scheduler_for(backend)
+    reply = scheduler.stream([], "Is the metro cheap?")
+    chunks = reply.chunks()
+    next(chunks)
+    # The reader moves on, e.g. to a newer message
+    chunks.close()
+    wait_until_idle(scheduler)
+    assert isinstance(reply.error, RequestCancelledError)
+    assert len(reply._chunks) < len(backend.reply_text([], "Is the metro cheap?").split(" "))
+    assert scheduler.stats()["cancelled"] == 1
+
+
+def test_deadline_is_raised_and_counted():
+    backend = ScriptedBackend([0.3])
+    scheduler = scheduler_for(backend, timeout=0.1)
+    with pytest.raises(DeadlineExceededError):
+        "".join(scheduler.stream([], "Is the metro cheap?"))
+    wait_until_idle(scheduler)
+    stats = scheduler.stats()
+    assert (stats["deadline_exceeded"], stats["cancelled"]) == (1, 0)
+
+
+def test_hedge_wins_over_a_slow_first_attempt():
+    backend = ScriptedBackend([0.05, 1.0])
+    scheduler = scheduler_for(backend, hedge_percentile=50)
+    scheduler.HEDGE_MIN_SAMPLES = 1
+    scheduler.generate([], "Is the metro cheap?")
+
+    start = time.monotonic()
+    reply = scheduler.generate([], "Is the metro expensive?")
+    assert reply.text and time.monotonic() - start < 0.8
+    stats = scheduler.stats()
+    assert (stats["hedged"], stats["hedge_wins"]) == (1, 1)
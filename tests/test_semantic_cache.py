@@ -0,0 +1,41 @@
+import pytest
+
+from semantic_cache import SimilarityIndex
+
+
+def index_of(*questions):
+    index = SimilarityIndex()
+    for question in questions:
+        index.add(question, f"key:{question}")
+    return index
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("What are the top 5 attractions?", "What are the top 5 attractions for kids?"),
+    ("Is Dubai safe for women?", "Is Dubai not safe for women?"),
+    ("What are the top 5 attractions for kids?", "What are the top 5 attractions?"),
+    ("What can I do for under 100 AED?", "What can I do for under 200 AED?"),
+])
+def test_questions_asking_something_else_do_not_match(stored, asked):
+    assert index_of(stored).search(asked) is None
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("What are the top 5 attractions?", "top attractions in Dubai?"),
+    ("Is Dubai safe for women?", "is dubai safe for women"),
+    ("What's the cheapest way to get around?", "cheapest way to get around dubai"),
+    ("When is the best time to visit?", "When's the best time to visit Dubai?"),
+])
+def test_rewordings_match(stored, asked):
+    match = index_of(stored).search(asked)
+    assert match is not None and match.question == stored
+
+
+def test_audit_log_file_is_created_on_the_first_match(tmp_path):
+    from semantic_cache import MatchAuditLog, SimilarMatch
+
+    path = tmp_path / "matches.jsonl"
+    log = MatchAuditLog(str(path))
+    assert not path.exists()
+    log.record("top attractions?", SimilarMatch("key", "What are the top 5 attractions?", 0.9), 0.8)
+    assert path.exists()